@@ -0,0 +1 @@
+"""Benchmarks for the Portflow exporter (not part of the shipped package)."""
@@ -0,0 +1,200 @@
+"""
+End-to-end throughput benchmark against the local mock Portflow server.
+
+Each scenario runs in a fresh child process so peak RSS is measured per run:
+
+    python -m benchmarks.e2e --students 300 --latency-ms 25 --workers 1,8,16
+    python -m benchmarks.e2e --students 300 --json baseline.json
+    python -m benchmarks.e2e --students 300 --compare baseline.json
+
+Scenarios:
+  collect  logic.collect_results for every student, one after another
+  csv      the "All students (CSV)" path: iter_student_results + StreamingCsvWriter
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .mock_server import MockPortflowServer, add_config_arguments, config_from_args
+
+TOKEN = "benchmark-token"
+SCENARIOS = ("collect", "csv")
+
+
+def peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil  # type: ignore[import-not-found]
+        except ImportError:
+            return None
+        return int(psutil.Process().memory_info().peak_wset / 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux.
+    return int(peak / 1024) if sys.platform == "darwin" else int(peak)
+
+
+def _child(base_url: str, scenario: str, workers: int, queue: Any) -> None:
+    try:
+        _run_child(base_url, scenario, workers, queue)
+    except BaseException as e:  # the parent blocks on the queue, so always answer
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        raise
+
+
+def _run_child(base_url: str, scenario: str, workers: int, queue: Any) -> None:
+    from portflow_exporter import api, logic
+    from portflow_exporter.constants import MAX_CONNECTIONS
+    from portflow_exporter.exporters import StreamingCsvWriter
+
+    sys.stdout = open(os.devnull, "w")
+    api.configure_client(base_url=base_url, max_connections=max(MAX_CONNECTIONS, workers))
+
+    started = time.perf_counter()
+    shared = api.get_shared_collections(TOKEN)
+    if not isinstance(shared, list):
+        queue.put({"error": f"shared collections failed: {shared}"})
+        return
+    students = logic.extract_students(shared)
+
+    evaluations = 0
+    if scenario == "collect":
+        for name, data in students.items():
+            results = logic.collect_results(TOKEN, name, data, True, workers=workers)
+            if results == api.TokenExpired:
+                queue.put({"error": "token expired"})
+                return
+            evaluations += len(results)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            with StreamingCsvWriter(os.path.join(tmp, "results.csv"), include_reviewer=True) as writer:
+                for name, results in logic.iter_student_results(TOKEN, students, True, workers=workers):
+                    if results == api.TokenExpired:
+                        queue.put({"error": "token expired"})
+                        return
+                    evaluations += len(results)
+                    writer.write_student(name, results)  # type: ignore[arg-type]
+
+    queue.put(
+        {
+            "wall_seconds": time.perf_counter() - started,
+            "students": len(students),
+            "evaluations": evaluations,
+            "peak_rss_kb": peak_rss_kb(),
+        }
+    )
+
+
+def run_scenario(server: MockPortflowServer, scenario: str, workers: int) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    before = server.stats()
+    process = ctx.Process(target=_child, args=(server.base_url, scenario, workers, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    after = server.stats()
+
+    requests_made = after["requests"] - before["requests"]
+    result.update(
+        {
+            "scenario": scenario,
+            "workers": workers,
+            "requests": requests_made,
+            "bytes": after["bytes_sent"] - before["bytes_sent"],
+        }
+    )
+    if "wall_seconds" in result:
+        result["requests_per_second"] = requests_made / max(result["wall_seconds"], 1e-9)
+    return result
+
+
+def print_table(rows: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    header = f"{'scenario':<9} {'workers':>7} {'wall s':>9} {'requests':>9} {'req/s':>9} {'MB':>8} {'peak RSS MB':>12}"
+    if baseline:
+        header += f" {'vs base':>9}"
+    print(header)
+    for row in rows:
+        if "error" in row:
+            print(f"{row['scenario']:<9} {row['workers']:>7} ERROR: {row['error']}")
+            continue
+        rss = row.get("peak_rss_kb")
+        line = (
+            f"{row['scenario']:<9} {row['workers']:>7} {row['wall_seconds']:>9.2f} {row['requests']:>9} "
+            f"{row['requests_per_second']:>9.1f} {row['bytes'] / 1e6:>8.1f} "
+            f"{(rss / 1024 if rss else float('nan')):>12.1f}"
+        )
+        base = (baseline or {}).get(_row_key(row))
+        if base and "wall_seconds" in base:
+            line += f" {row['wall_seconds'] / base['wall_seconds'] - 1:>+9.1%}"
+        print(line)
+
+
+def _row_key(row: Dict[str, Any]) -> str:
+    return f"{row['scenario']}/{row['workers']}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_config_arguments(parser)
+    parser.add_argument("--workers", type=str, default="1,8", help="Comma-separated worker counts")
+    parser.add_argument("--scenario", choices=SCENARIOS, nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=str, default=None, help="Compare wall time against a previous --json file")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="With --compare: exit 1 when any run is this much slower (default 0.2 = 20%%)",
+    )
+    args = parser.parse_args(argv)
+
+    workers = [int(w) for w in args.workers.split(",") if w.strip()]
+    config = config_from_args(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {_row_key(row): row for row in json.load(f)["runs"]}
+
+    rows = []
+    with MockPortflowServer(config) as server:
+        print(
+            f"Mock cohort: {args.students} students x {args.portfolios} portfolios x {args.goals} goals, "
+            f"~{args.items} items/goal, latency {args.latency_ms} ms, error rate {args.error_rate}"
+        )
+        for scenario in args.scenario:
+            for count in workers:
+                rows.append(run_scenario(server, scenario, count))
+
+    print_table(rows, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "runs": rows}, f, indent=2)
+
+    if baseline:
+        slower = [
+            _row_key(row)
+            for row in rows
+            if _row_key(row) in baseline
+            and "wall_seconds" in row
+            and row["wall_seconds"] > baseline[_row_key(row)]["wall_seconds"] * (1 + args.max_regression)
+        ]
+        if slower:
+            print(f"Regression in: {', '.join(slower)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
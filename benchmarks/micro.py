@@ -0,0 +1,235 @@
+"""
+CPU micro-benchmarks for the per-item parsing and aggregation paths.
+
+No network is involved; the payloads come from benchmarks.synthetic. Each
+case reports the best-of-N time per item, so numbers stay comparable when
+the payload size changes:
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --json micro-base.json
+    python -m benchmarks.micro --compare micro-base.json
+    python -m benchmarks.micro --filter timestamp
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from portflow_exporter import decoding, logic
+from portflow_exporter.constants import GOAL_ORDER, PER_PAGE
+from portflow_exporter.exporters import StreamingCsvWriter, sort_goals
+from portflow_exporter.levels import level_index
+from portflow_exporter.results import ResultSet
+from portflow_exporter.time_range import (
+    TimeRange,
+    evaluation_timestamp,
+    parse_iso_datetime,
+    pick_evaluation_timestamp,
+)
+
+from . import synthetic
+from .synthetic import CohortSpec
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    run: Callable[[], Any]
+    # Items processed per call of `run`, to report a per-item cost.
+    items: int
+
+
+def _feedback_payload(spec: CohortSpec) -> List[dict]:
+    items: List[dict] = []
+    for portfolio_id in synthetic.portfolio_ids(spec, 0):
+        for goal in synthetic.goals(spec, portfolio_id):
+            items.extend(synthetic.feedback_items(spec, portfolio_id, goal["id"]))
+    return items
+
+
+def _without(items: List[dict], *keys: str) -> List[dict]:
+    stripped = []
+    for item in items:
+        copy = {k: v for k, v in item.items() if k not in keys}
+        if isinstance(copy.get("evaluation"), dict):
+            copy["evaluation"] = {k: v for k, v in copy["evaluation"].items() if k not in keys}
+        stripped.append(copy)
+    return stripped
+
+
+def _results(spec: CohortSpec, students: int) -> Dict[str, ResultSet]:
+    results: Dict[str, ResultSet] = {}
+    for index in range(students):
+        name = synthetic.student_name(index)
+        student_results = results[name] = ResultSet(include_reviewer=True)
+        for portfolio_id in synthetic.portfolio_ids(spec, index):
+            for goal in synthetic.goals(spec, portfolio_id):
+                items = synthetic.feedback_items(spec, portfolio_id, goal["id"])
+                student_results.extend(logic.goal_results(name, goal["name"], items, include_reviewer=True))
+    return results
+
+
+def build_cases(items_per_goal: int, students: int, tmp_dir: str) -> List[Case]:
+    spec = CohortSpec(students=students, items_per_goal=items_per_goal)
+    items = _feedback_payload(spec)
+    # Worst realistic case for the timestamp probe: no "date", so it falls
+    # through to the created_at fallbacks.
+    created_only = _without(items, "date")
+    no_timestamp = _without(items, "date", "created_at", "updated_at")
+    stamps = [item["date"] for item in items]
+    evaluations = [item["evaluation"] for item in items]
+    # As they come out of decoding, with the level set reduced and shared.
+    decoded_evaluations = [decoding.project_evaluation(e) for e in evaluations]
+    goal_names = [goal for goal in GOAL_ORDER + synthetic.EXTRA_GOALS for _ in range(20)]
+    grouped = _results(spec, students)
+    result_count = sum(len(student_results) for student_results in grouped.values())
+    # The same rows as one dict per evaluation, the format before ResultSet.
+    grouped_rows = {name: student_results.rows() for name, student_results in grouped.items()}
+    window = TimeRange(start=synthetic.EPOCH.replace(month=3), end=synthetic.EPOCH)
+
+    csv_path = os.path.join(tmp_dir, "results.csv")
+    # One API page of feedback items, as bytes off the wire.
+    page = json.dumps(items[:PER_PAGE]).encode("utf-8")
+    page_items = len(json.loads(page))
+
+    def decode_with(backend: str) -> Callable[[], Any]:
+        decoder = decoding.BACKENDS[backend]()
+        return lambda: decoder(page)
+
+    decode_cases = [Case("decode_feedback_page/full json.loads", lambda: json.loads(page), page_items)]
+    for backend in decoding.BACKENDS:
+        try:
+            decode_cases.append(Case(f"decode_feedback_page/{backend}", decode_with(backend), page_items))
+        except ImportError:
+            pass
+
+    def export_streaming(students: Dict[str, Any]) -> Callable[[], None]:
+        def run() -> None:
+            with StreamingCsvWriter(csv_path, include_reviewer=True) as writer:
+                for name, student_results in students.items():
+                    writer.write_student(name, student_results)
+
+        return run
+
+    return [
+        Case("parse_iso_datetime", lambda: [parse_iso_datetime(s) for s in stamps], len(stamps)),
+        Case("pick_evaluation_timestamp/date", lambda: [pick_evaluation_timestamp(i) for i in items], len(items)),
+        Case(
+            "pick_evaluation_timestamp/created_at",
+            lambda: [pick_evaluation_timestamp(i) for i in created_only],
+            len(created_only),
+        ),
+        Case(
+            "pick_evaluation_timestamp/missing",
+            lambda: [pick_evaluation_timestamp(i) for i in no_timestamp],
+            len(no_timestamp),
+        ),
+        Case("evaluation_timestamp/date", lambda: [evaluation_timestamp(i) for i in items], len(items)),
+        *decode_cases,
+        Case("resolve_level", lambda: [logic.resolve_level(e) for e in evaluations], len(evaluations)),
+        Case(
+            "level_index/decoded",
+            lambda: [level_index.resolve(e) for e in decoded_evaluations],
+            len(decoded_evaluations),
+        ),
+        Case(
+            "goal_results/time_range",
+            lambda: logic.goal_results("Student", "Goal", items, True, window),
+            len(items),
+        ),
+        Case("sort_goals", lambda: sort_goals(goal_names), len(goal_names)),
+        Case("StreamingCsvWriter", export_streaming(grouped), result_count),
+        Case("StreamingCsvWriter/dict rows", export_streaming(grouped_rows), result_count),
+    ]
+
+
+def measure(case: Case, repeat: int, min_time: float) -> Dict[str, Any]:
+    timer = timeit.Timer(case.run)
+    number, elapsed = timer.autorange()
+    # autorange stops at >= 0.2 s; scale up to the requested minimum.
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {
+        "name": case.name,
+        "items": case.items,
+        "seconds_per_call": best,
+        "ns_per_item": best / max(case.items, 1) * 1e9,
+    }
+
+
+def print_table(rows: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    width = max(len(row["name"]) for row in rows)
+    header = f"{'case':<{width}} {'items':>8} {'ms/call':>10} {'ns/item':>10}"
+    if baseline:
+        header += f" {'base ns':>10} {'change':>8}"
+    print(header)
+    for row in rows:
+        line = f"{row['name']:<{width}} {row['items']:>8} {row['seconds_per_call'] * 1e3:>10.3f} {row['ns_per_item']:>10.0f}"
+        base = (baseline or {}).get(row["name"])
+        if base:
+            line += f" {base['ns_per_item']:>10.0f} {row['ns_per_item'] / base['ns_per_item'] - 1:>+8.1%}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=40, help="Average feedback items per goal")
+    parser.add_argument("--students", type=int, default=50, help="Students in the CSV export cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--filter", type=str, default=None, help="Only run cases containing this text")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=str, default=None, help="Compare against a previous --json file")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="With --compare: exit 1 when any case is this much slower per item (default 0.2 = 20%%)",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {row["name"]: row for row in json.load(f)["cases"]}
+
+    with tempfile.TemporaryDirectory(prefix="portflow-micro-") as tmp_dir:
+        cases = build_cases(args.items, args.students, tmp_dir)
+        if args.filter:
+            cases = [case for case in cases if args.filter in case.name]
+        rows = [measure(case, args.repeat, args.min_time) for case in cases]
+    print(f"Python {platform.python_version()} ({platform.python_implementation()}) on {sys.platform}")
+    print_table(rows, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"python": platform.python_version(), "config": vars(args), "cases": rows},
+                f,
+                indent=2,
+            )
+
+    if baseline:
+        slower = [
+            row["name"]
+            for row in rows
+            if row["name"] in baseline
+            and row["ns_per_item"] > baseline[row["name"]]["ns_per_item"] * (1 + args.max_regression)
+        ]
+        if slower:
+            print(f"Regression in: {', '.join(slower)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+"""
+Local stand-in for the Portflow API, serving a synthetic cohort.
+
+Run standalone and point the exporter at it:
+
+    python -m benchmarks.mock_server --port 8765 --students 300
+    python portflow_export.py --base-url http://127.0.0.1:8765/api/v1 --token test
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from . import synthetic
+from .synthetic import CohortSpec
+
+API_PREFIX = "/api/v1"
+_GOALS_RE = re.compile(r"^/portfolios/([^/]+)/goals$")
+_FEEDBACK_RE = re.compile(r"^/portfolios/([^/]+)/goals/([^/]+)/feedback-items$")
+
+
+@dataclass
+class ServerConfig:
+    spec: CohortSpec = field(default_factory=CohortSpec)
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    # Fraction of requests answered with 429 (with Retry-After) or 500/502/503.
+    error_rate: float = 0.0
+    retry_after: int = 1
+    # Fraction of portfolios whose goals return 404.
+    not_found_rate: float = 0.0
+    # Fraction of goals whose feedback always answers 503.
+    failing_feedback_rate: float = 0.0
+    # Answer 401 to everything after this many requests.
+    unauthorized_after: Optional[int] = None
+    # Pagination quirks.
+    ignore_per_page: bool = False
+    server_page_size: int = 10
+    # Largest per_page honoured; bigger requests get pages of this size.
+    max_per_page: Optional[int] = None
+    link_headers: bool = False
+    total_count_header: bool = False
+    default_order: str = "desc"
+    etags: bool = True
+    gzip: bool = True
+    seed: int = 1
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.bytes_sent = 0
+
+    def record(self, endpoint: str, status: int, size: int) -> None:
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.statuses[status] += 1
+            self.bytes_sent += size
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "by_endpoint": dict(self.requests),
+                "by_status": {str(k): v for k, v in self.statuses.items()},
+                "bytes_sent": self.bytes_sent,
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def setup(self) -> None:
+        super().setup()
+        # Headers and body are written separately; without this Nagle plus
+        # delayed ACKs add ~40 ms to every keep-alive response.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+
+        if path == "/__stats":
+            self._send_json("__stats", 200, self.server.stats.snapshot())
+            return
+
+        config = self.server.config
+        endpoint, items, extract_key = self._route(path, query)
+        if endpoint is None:
+            self._send_empty("unknown", 404)
+            return
+
+        with self.server.counter_lock:
+            self.server.counter += 1
+            count = self.server.counter
+        rng = random.Random(f"{config.seed}|{count}")
+
+        if config.latency_ms or config.latency_jitter_ms:
+            time.sleep(max(0.0, config.latency_ms + rng.uniform(-1, 1) * config.latency_jitter_ms) / 1000.0)
+
+        if config.unauthorized_after is not None and count > config.unauthorized_after:
+            self._send_empty(endpoint, 401)
+            return
+        if config.error_rate and rng.random() < config.error_rate:
+            status = rng.choice([429, 500, 502, 503])
+            headers = {"Retry-After": str(config.retry_after)} if status == 429 else {}
+            self._send_empty(endpoint, status, headers)
+            return
+        if (
+            endpoint == "feedback"
+            and config.failing_feedback_rate
+            and random.Random(f"{config.seed}|{path}").random() < config.failing_feedback_rate
+        ):
+            self._send_empty(endpoint, 503)
+            return
+        if items is None:
+            self._send_empty(endpoint, 404)
+            return
+
+        if query.get("order_direction", config.default_order) == "asc":
+            items = list(reversed(items))
+
+        page = int(query.get("page", 1) or 1)
+        requested = query.get("per_page")
+        size = config.server_page_size
+        if requested and not config.ignore_per_page:
+            size = max(1, int(requested))
+            if config.max_per_page is not None:
+                size = min(size, config.max_per_page)
+        chunk = items[(page - 1) * size : page * size]
+        total_pages = max(1, -(-len(items) // size))
+
+        headers: Dict[str, str] = {}
+        if config.total_count_header:
+            headers["X-Total-Count"] = str(len(items))
+            headers["X-Per-Page"] = str(size)
+        if config.link_headers:
+            links = []
+            base = f"http://{self.headers.get('Host')}{parsed.path}"
+            if page < total_pages:
+                links.append(f'<{base}?{urlencode({**query, "page": page + 1})}>; rel="next"')
+            links.append(f'<{base}?{urlencode({**query, "page": total_pages})}>; rel="last"')
+            headers["Link"] = ", ".join(links)
+
+        body = {extract_key: chunk} if extract_key else chunk
+        self._send_json(endpoint, 200, body, headers)
+
+    def _route(self, path: str, query: Dict[str, str]) -> Tuple[Optional[str], Optional[List[dict]], Optional[str]]:
+        config = self.server.config
+        spec = config.spec
+        if path == "/lms/sections":
+            return "sections", synthetic.sections(), None
+        if path == "/shares/shared-with-me":
+            return "shared", synthetic.shared_collections(spec), None
+        if path == "/dashboard":
+            # Every known section has the same cohort; other ids answer 404 like the real API.
+            if query.get("section_id") not in {str(section["id"]) for section in synthetic.sections()}:
+                return "students", None, None
+            return "students", synthetic.dashboard_students(spec), "students"
+
+        match = _GOALS_RE.match(path)
+        if match:
+            portfolio_id = match.group(1)
+            if config.not_found_rate and random.Random(f"{config.seed}|{portfolio_id}").random() < config.not_found_rate:
+                return "goals", None, None
+            return "goals", synthetic.goals(spec, portfolio_id), None
+
+        match = _FEEDBACK_RE.match(path)
+        if match:
+            return "feedback", synthetic.feedback_items(spec, match.group(1), match.group(2)), None
+        return None, None, None
+
+    def _send_empty(self, endpoint: str, status: int, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.server.stats.record(endpoint, status, 0)
+
+    def _send_json(self, endpoint: str, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        config = self.server.config
+        payload = json.dumps(body).encode("utf-8")
+
+        etag = None
+        if config.etags and endpoint != "__stats":
+            etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send_empty(endpoint, 304, {"ETag": etag})
+                return
+
+        encoding = None
+        if config.gzip and len(payload) > 1024 and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            payload = gzip.compress(payload, 5)
+            encoding = "gzip"
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.stats.record(endpoint, status, len(payload))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: ServerConfig) -> None:
+        super().__init__(address, _Handler)
+        self.config = config
+        self.stats = _Stats()
+        self.counter = 0
+        self.counter_lock = threading.Lock()
+
+
+class MockPortflowServer:
+    def __init__(self, config: Optional[ServerConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or ServerConfig()
+        self._server = _Server((host, port), self.config)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def stats(self) -> Dict[str, Any]:
+        return self._server.stats.snapshot()
+
+    def start(self) -> "MockPortflowServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-portflow", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockPortflowServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--portfolios", type=int, default=1, help="Portfolios per student")
+    parser.add_argument("--goals", type=int, default=10, help="Goals per portfolio")
+    parser.add_argument("--items", type=int, default=40, help="Average feedback items per goal")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429/5xx answers")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="Fraction of portfolios answering 404")
+    parser.add_argument(
+        "--failing-feedback-rate", type=float, default=0.0, help="Fraction of goals whose feedback always fails"
+    )
+    parser.add_argument("--unauthorized-after", type=int, default=None, help="Answer 401 after N requests")
+    parser.add_argument("--ignore-per-page", action="store_true", help="Serve a fixed page size")
+    parser.add_argument("--max-per-page", type=int, default=None, help="Cap the honoured per_page")
+    parser.add_argument("--link-headers", action="store_true")
+    parser.add_argument("--total-count", action="store_true", help="Send X-Total-Count headers")
+    parser.add_argument("--no-etags", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def config_from_args(args: argparse.Namespace) -> ServerConfig:
+    return ServerConfig(
+        spec=CohortSpec(
+            students=args.students,
+            portfolios_per_student=args.portfolios,
+            goals_per_portfolio=args.goals,
+            items_per_goal=args.items,
+            seed=args.seed,
+        ),
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate,
+        failing_feedback_rate=args.failing_feedback_rate,
+        unauthorized_after=args.unauthorized_after,
+        ignore_per_page=args.ignore_per_page,
+        max_per_page=args.max_per_page,
+        link_headers=args.link_headers,
+        total_count_header=args.total_count,
+        etags=not args.no_etags,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockPortflowServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Serving mock Portflow API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
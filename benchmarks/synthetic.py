@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List
+
+from portflow_exporter.constants import GOAL_ORDER
+
+LEVEL_SET = [
+    {"id": "lvl-start", "label": "Startniveau"},
+    {"id": "lvl-1", "label": "1"},
+    {"id": "lvl-2", "label": "2"},
+    {"id": "lvl-3", "label": "3"},
+]
+EXTRA_GOALS = ["Onderzoekend vermogen", "Ethisch handelen"]
+ITEM_TYPES = ["criterion_evaluation", "criterion_evaluation", "criterion_evaluation", "comment", "file"]
+ROLES = ["coach", "teacher", "peer", "self"]
+EPOCH = datetime(2026, 9, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True)
+class CohortSpec:
+    students: int = 100
+    portfolios_per_student: int = 1
+    goals_per_portfolio: int = 10
+    items_per_goal: int = 40
+    seed: int = 1
+
+
+def _rng(spec: CohortSpec, *parts: object) -> random.Random:
+    return random.Random("|".join(str(p) for p in (spec.seed,) + parts))
+
+
+def student_name(index: int) -> str:
+    return f"Student {index:05d}"
+
+
+def portfolio_ids(spec: CohortSpec, student_index: int) -> List[str]:
+    return [f"pf-{student_index}-{k}" for k in range(spec.portfolios_per_student)]
+
+
+@lru_cache(maxsize=8)
+def shared_collections(spec: CohortSpec) -> List[dict]:
+    items = []
+    for index in range(spec.students):
+        for portfolio_id in portfolio_ids(spec, index):
+            items.append(
+                {
+                    "id": f"share-{portfolio_id}",
+                    "portfolio_id": portfolio_id,
+                    "inviter": {"id": index, "name": student_name(index), "current_role": "student"},
+                }
+            )
+    return items
+
+
+@lru_cache(maxsize=8)
+def dashboard_students(spec: CohortSpec) -> List[dict]:
+    rows = []
+    for index in range(spec.students):
+        for portfolio_id in portfolio_ids(spec, index):
+            rows.append(
+                {"id": index, "name": student_name(index), "portfolio_id": portfolio_id, "share_type": "view"}
+            )
+    return rows
+
+
+def goals(spec: CohortSpec, portfolio_id: str) -> List[dict]:
+    names = (GOAL_ORDER + EXTRA_GOALS)[: spec.goals_per_portfolio]
+    return [{"id": f"{portfolio_id}-g{i}", "name": name} for i, name in enumerate(names)]
+
+
+@lru_cache(maxsize=4096)
+def feedback_items(spec: CohortSpec, portfolio_id: str, goal_id: str) -> List[dict]:
+    """Items of one goal, newest first, like the API with order_direction=desc."""
+    rng = _rng(spec, portfolio_id, goal_id)
+    count = max(0, int(rng.gauss(spec.items_per_goal, spec.items_per_goal / 4)))
+    moment = EPOCH
+    items = []
+    for k in range(count):
+        moment -= timedelta(hours=rng.randint(1, 240))
+        stamp = moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        level = rng.choice(LEVEL_SET)
+        items.append(
+            {
+                "id": f"{goal_id}-i{k}",
+                "type": rng.choice(ITEM_TYPES),
+                "role": rng.choice(ROLES),
+                "date": stamp,
+                "created_at": stamp,
+                "updated_at": stamp,
+                "body": "Lorem ipsum dolor sit amet, " * rng.randint(1, 8),
+                "evaluation": {
+                    "id": f"{goal_id}-e{k}",
+                    "level": level["id"],
+                    "level_set": LEVEL_SET,
+                    "reviewer": {"id": rng.randint(1, 40), "name": f"Coach {rng.randint(1, 40)}"},
+                    "created_at": stamp,
+                },
+            }
+        )
+    return items
+
+
+@lru_cache(maxsize=8)
+def sections(count: int = 25) -> List[Dict[str, object]]:
+    prefixes = ["Coach ", "Gilde ", ""]
+    return [{"id": 1000 + i, "name": f"{prefixes[i % 3]}Groep {i:02d}"} for i in range(count)]
@@ -1,27 +1,288 @@
 from __future__ import annotations
 
+import threading
 import time
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from .constants import BASE_URL, PER_PAGE
+from . import profiling
+from .archive import ResponseArchive
+from .constants import BASE_URL, MAX_CONNECTIONS, PER_PAGE, REQUEST_TIMEOUT
+from .decoding import decode_feedback_page
+from .http_cache import HttpCache, account_key, cache_key
+from .metrics import RequestMetrics
+from .pagination import Paginator, set_page_size
+from .retry import CircuitBreaker, RetryBudget, RetryPolicy, parse_retry_after
+from .throttle import AdaptiveLimiter
+from .time_range import TimeRange, created_timestamp, datetime_epoch_us, evaluation_timestamp, has_evaluation_date
 
 
 TokenExpired = "TOKEN_EXPIRED"
 NotFound = "NOT_FOUND"
+# Requests for a student kept failing (after retries and a deferred retry);
+# the export stops so it can be resumed, the token is fine.
+RequestFailed = "REQUEST_FAILED"
+
+# Per-thread request settings, see background() and stop_on().
+_local = threading.local()
+
+
+@contextmanager
+def background(gate: Callable[[], bool]) -> Iterator[None]:
+    """
+    Marks the requests sent from this thread as background work.
+
+    `gate()` is called before every request and may block until it is the
+    background's turn; when it returns False the request is given up (as
+    None). Paginated calls fetch their pages one at a time meanwhile, so a
+    background thread has at most one request in flight.
+    """
+    previous = getattr(_local, "gate", None)
+    _local.gate = gate
+    try:
+        yield
+    finally:
+        _local.gate = previous
+
+
+def in_background() -> bool:
+    return getattr(_local, "gate", None) is not None
+
+
+@contextmanager
+def stop_on(stop: threading.Event) -> Iterator[None]:
+    """
+    Requests sent from this thread give up (as None) once `stop` is set,
+    also while waiting for the circuit breaker or for a retry.
+    """
+    previous = getattr(_local, "stop", None)
+    _local.stop = stop
+    try:
+        yield
+    finally:
+        _local.stop = previous
+
+
+class ApiClient:
+    """
+    Shared HTTP client for the Portflow API.
+
+    One keep-alive session with a bounded connection pool per host, so
+    consecutive requests reuse TCP/TLS connections instead of reconnecting.
+    """
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        max_connections: int = MAX_CONNECTIONS,
+        timeout: float = REQUEST_TIMEOUT,
+        cache: Optional[HttpCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        archive: Optional[ResponseArchive] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = cache
+        self.archive = archive
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_budget = RetryBudget()
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveLimiter(max_limit=max_connections)
+        self.metrics = RequestMetrics()
+        # Identical requests in flight on other threads, see request_with_retries.
+        self.in_flight: Dict[Tuple[str, str], "Future[Any]"] = {}
+        self.in_flight_lock = threading.Lock()
+        self.session = requests.Session()
+        # pool_maxsize is per host; pool_block makes it a hard limit instead of
+        # opening (and discarding) extra connections under load.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "accept": "*/*",
+                "accept-encoding": "gzip, deflate",
+                "connection": "keep-alive",
+                "user-agent": "Mozilla/5.0",
+            }
+        )
+
+    def url(self, path: str) -> str:
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}{path}"
+
+    @staticmethod
+    def auth_headers(token: str) -> Dict[str, str]:
+        return {"authorization": f"Bearer {token}"}
+
+    def get(
+        self,
+        path: str,
+        token: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        endpoint: Optional[str] = None,
+    ) -> requests.Response:
+        request_headers = self.auth_headers(token)
+        if headers:
+            request_headers.update(headers)
+
+        # Every request goes through the adaptive limiter, whichever thread sends it.
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            with profiling.span("http", endpoint=endpoint, page=(params or {}).get("page")) as span_args:
+                response = self.session.get(
+                    self.url(path), headers=request_headers, params=params, timeout=self.timeout
+                )
+                span_args["status"] = response.status_code
+        except requests.exceptions.RequestException:
+            self.limiter.release(None, congested=True)
+            self.metrics.record_error(endpoint, time.monotonic() - started)
+            raise
+        latency = time.monotonic() - started
+        congested = response.status_code == 429 or response.status_code >= 500
+        self.limiter.release(latency, congested=congested)
+        # Content-Length is the size on the wire (compressed when gzipped).
+        size = response.headers.get("content-length")
+        size = int(size) if size and size.isdigit() else len(response.content)
+        self.metrics.record_response(endpoint, response.status_code, latency, size)
+        return response
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+_client: Optional[ApiClient] = None
+_client_lock = threading.Lock()
+
+
+def configure_client(**kwargs: Any) -> ApiClient:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = ApiClient(**kwargs)
+        return _client
+
+
+def concurrency_stats() -> Dict[str, float]:
+    return get_client().limiter.snapshot()
+
+
+def request_metrics() -> RequestMetrics:
+    return get_client().metrics
+
+
+def get_client() -> ApiClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
 
 
 def request_with_retries(
-    url: str,
-    headers: Dict[str, str],
+    path: str,
+    token: str,
     params: Optional[Dict[str, Any]] = None,
-    max_attempts: int = 3,
+    max_attempts: Optional[int] = None,
+    endpoint: Optional[str] = None,
 ) -> Union[requests.Response, str, None]:
+    client = get_client()
+    archive = client.archive
+    if archive is not None and archive.replaying:
+        response = archive.replay(path, params)
+        if response is None or response.status_code == 404:
+            return NotFound
+        return response
+
+    # Before joining a flight, so a foreground request never waits on a gated one.
+    gate = getattr(_local, "gate", None)
+    if gate is not None and not gate():
+        return None
+    stop = getattr(_local, "stop", None)
+    if stop is not None and stop.is_set():
+        return None
+
+    # Coalesce identical concurrent requests: the first thread asks the API,
+    # the others wait for and share its answer.
+    flight_key = (token, cache_key(path, params))
+    with client.in_flight_lock:
+        leader = client.in_flight.get(flight_key)
+        if leader is None:
+            future: "Future[Any]" = Future()
+            client.in_flight[flight_key] = future
+    if leader is not None:
+        client.metrics.record_coalesced(endpoint)
+        return leader.result()
+
+    try:
+        result = _request_with_retries(client, path, token, params, max_attempts, endpoint)
+        if archive is not None and (isinstance(result, requests.Response) or result == NotFound):
+            archive.record(path, params, endpoint, result if isinstance(result, requests.Response) else None)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+    finally:
+        with client.in_flight_lock:
+            client.in_flight.pop(flight_key, None)
+    return result
+
+
+def _request_with_retries(
+    client: ApiClient,
+    path: str,
+    token: str,
+    params: Optional[Dict[str, Any]],
+    max_attempts: Optional[int],
+    endpoint: Optional[str],
+) -> Union[requests.Response, str, None]:
+
+    # `endpoint` names the call site ("goals", "feedback", ...) for per-endpoint cache TTLs.
+    cache = client.cache if client.cache is not None and client.cache.handles(endpoint) else None
+    key = ""
+    cached = None
+    if cache is not None:
+        # Per account: answers cached for one token are never served to another.
+        key = f"{account_key(token)} {cache_key(client.url(path), params)}"
+        cached = cache.get(key)
+        if cached is not None and cache.is_fresh(endpoint, cached):
+            client.metrics.record_cache_hit(endpoint)
+            return cached.to_response()
+
+    stop = getattr(_local, "stop", None)
+    policy = client.retry_policy
+    attempts = max_attempts or policy.max_attempts
     attempt = 0
-    while attempt < max_attempts:
+    while True:
+        if not client.breaker.wait(stop):
+            return None
+        retry_after: Optional[float] = None
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=15)
+            response = client.get(
+                path,
+                token,
+                params=params,
+                headers=cached.conditional_headers() if cached else None,
+                endpoint=endpoint,
+            )
+
+            if response.status_code not in policy.retry_statuses:
+                # Any answer shows the API is up, which also settles a breaker probe.
+                client.breaker.record_success()
 
             if response.status_code == 401:
                 return TokenExpired
@@ -29,130 +290,122 @@ def request_with_retries(
             if response.status_code == 404:
                 return NotFound
 
-            response.raise_for_status()
+            if response.status_code == 304 and cache is not None and cached is not None:
+                cached = cache.refresh(key, cached, response)
+                client.metrics.record_cache_hit(endpoint, revalidated=True)
+                return cached.to_response()
+
+            if response.status_code in policy.retry_statuses:
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if retry_after is not None:
+                    # A huge Retry-After would pause every worker (see CircuitBreaker) indefinitely.
+                    retry_after = min(retry_after, policy.max_delay)
+                raise requests.exceptions.HTTPError(f"HTTP {response.status_code}", response=response)
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                # Other 4xx answers will not change by asking again.
+                print(f"Request failed: {e}")
+                return None
+
+            if cache is not None:
+                cache.put(key, endpoint, response)
             return response
 
         except requests.exceptions.RequestException as e:
             attempt += 1
-            print(f"Request failed ({attempt}/{max_attempts}): {e}")
-
-            if attempt < max_attempts:
-                print("Retrying in 5 seconds...")
-                time.sleep(5)
-            else:
-                print("3 failed attempts. Waiting 60 seconds...")
-                time.sleep(60)
+            client.breaker.record_failure(retry_after, retry=attempt > 1)
+
+            if attempt >= attempts or not client.retry_budget.try_spend():
+                print(f"Request failed ({attempt}/{attempts}): {e}. Giving up on this request for now.")
                 return None
 
+            delay = retry_after if retry_after is not None else policy.backoff(attempt)
+            client.metrics.record_retry(endpoint)
+            print(f"Request failed ({attempt}/{attempts}): {e}. Retrying in {delay:.1f} seconds...")
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                return None
 
-def get_all_sections(token: str, use_cache: bool = True, _cache: dict = {}) -> Union[List[dict], str, None]:
-    if use_cache and "sections" in _cache:
-        print("Using cached sections...")
-        return _cache["sections"]
 
-    headers = {
-        "accept": "*/*",
-        "authorization": f"Bearer {token}",
-        "user-agent": "Mozilla/5.0",
-    }
+def _page_fetcher(path: str, token: str, endpoint: str, params: Optional[Dict[str, Any]] = None):
+    # Pages may be fetched on the paginator's own threads; they stop with the caller.
+    stop = getattr(_local, "stop", None)
 
-    all_sections: List[dict] = []
-    page = 1
+    def fetch(page: int, per_page: Optional[int]) -> Union[requests.Response, str, None]:
+        page_params = {**(params or {}), "page": page}
+        if per_page is not None:
+            page_params["per_page"] = per_page
+        if stop is None:
+            return request_with_retries(path, token, params=page_params, endpoint=endpoint)
+        with stop_on(stop):
+            return request_with_retries(path, token, params=page_params, endpoint=endpoint)
 
-    print("Fetching sections...")
-    while True:
-        response = request_with_retries(f"{BASE_URL}/lms/sections", headers, params={"page": page})
-        if response in (None, TokenExpired, NotFound):
-            return response
+    return fetch
 
-        data = response.json()
-        if not data:
-            break
 
-        all_sections.extend(data)
+# /lms/sections is called without per_page and serves 10 per page.
+set_page_size("sections", 10)
 
-        if len(data) < 10:
-            break
-        page += 1
 
-    print(f"Found {len(all_sections)} sections.")
-    _cache["sections"] = all_sections
-    return all_sections
+def get_all_sections(
+    token: str, use_cache: bool = True, quiet: bool = False, _cache: dict = {}
+) -> Union[List[dict], str, None]:
+    if use_cache and "sections" in _cache:
+        if not quiet:
+            print("Using cached sections...")
+        return _cache["sections"]
 
+    if not quiet:
+        print("Fetching sections...")
+    paginator = Paginator(_page_fetcher("/lms/sections", token, "sections"), endpoint="sections")
+    all_sections: List[dict] = [section for page in paginator.pages() for section in page]
+    if paginator.failed:
+        return paginator.error
 
-def get_shared_collections(token: str) -> Union[List[dict], str, None]:
-    headers = {
-        "accept": "*/*",
-        "authorization": f"Bearer {token}",
-        "user-agent": "Mozilla/5.0",
-    }
+    if not quiet:
+        print(f"Found {len(all_sections)} sections.")
+    _cache["sections"] = all_sections
+    return all_sections
 
-    print("Fetching shared collections...")
-    all_items: List[dict] = []
-    page = 1
-    seen_ids: set = set()
 
-    while True:
-        response = request_with_retries(
-            f"{BASE_URL}/shares/shared-with-me",
-            headers,
-            params={
-                "order_by": "created_at",
-                "order_direction": "desc",
-                "page": page,
-                "per_page": PER_PAGE,
-            },
-        )
-        if response in (None, TokenExpired, NotFound):
-            return response
+def get_shared_collections(token: str, quiet: bool = False) -> Union[List[dict], str, None]:
+    if not quiet:
+        print("Fetching shared collections...")
+    paginator = Paginator(
+        _page_fetcher(
+            "/shares/shared-with-me",
+            token,
+            "shared",
+            params={"order_by": "created_at", "order_direction": "desc"},
+        ),
+        endpoint="shared",
+        per_page=PER_PAGE,
+    )
+    all_items: List[dict] = [item for page in paginator.pages() for item in page]
+    if paginator.failed:
+        return paginator.error
 
-        data = response.json()
-        if not data:
-            break
-
-        # Avoid premature termination if the API ignores per_page, and avoid infinite loops
-        new_count = 0
-        for item in data:
-            item_id = item.get("id") if isinstance(item, dict) else None
-            if item_id is None or item_id not in seen_ids:
-                all_items.append(item)
-                new_count += 1
-                if item_id is not None:
-                    seen_ids.add(item_id)
-
-        if new_count == 0:
-            break
-        page += 1
-
-    print(f"Found {len(all_items)} shared collections.")
+    if not quiet:
+        print(f"Found {len(all_items)} shared collections.")
     return all_items
 
 
 def get_students_from_section(token: str, section_id: str) -> Union[dict, str, None]:
-    headers = {
-        "accept": "*/*",
-        "authorization": f"Bearer {token}",
-        "user-agent": "Mozilla/5.0",
-    }
-
     print("Fetching students from section...")
     students: dict = {}
-    page = 1
-
-    while True:
-        response = request_with_retries(
-            f"{BASE_URL}/dashboard",
-            headers,
-            params={"section_id": section_id, "page": page, "per_page": PER_PAGE},
-        )
-        if response in (None, TokenExpired, NotFound):
-            return response
-
-        data = response.json()
-        page_students = data.get("students", [])
-        if not page_students:
-            break
+    paginator = Paginator(
+        _page_fetcher("/dashboard", token, "students", params={"section_id": section_id}),
+        endpoint="students",
+        per_page=PER_PAGE,
+        extract=lambda data: data.get("students", []) if isinstance(data, dict) else [],
+        # A student appears once per portfolio, so the id alone is not unique.
+        key=lambda student: (student.get("id"), student.get("portfolio_id")),
+    )
 
+    for page_students in paginator.pages():
         for student in page_students:
             name = student["name"]
             portfolio_id = student.get("portfolio_id")
@@ -169,59 +422,126 @@ def get_students_from_section(token: str, section_id: str) -> Union[dict, str, N
             if portfolio_id:
                 students[name]["portfolio_ids"].add(portfolio_id)
 
-        page += 1
+    if paginator.failed:
+        return paginator.error
 
     print(f"Found {len(students)} students.")
     return students
 
 
 def get_goals(token: str, portfolio_id: str) -> Union[List[dict], str, None]:
-    headers = {"accept": "*/*", "authorization": f"Bearer {token}"}
-    response = request_with_retries(
-        f"{BASE_URL}/portfolios/{portfolio_id}/goals",
-        headers,
-        params={"page": 1, "per_page": PER_PAGE},
+    paginator = Paginator(
+        _page_fetcher(f"/portfolios/{portfolio_id}/goals", token, "goals"),
+        endpoint="goals",
+        per_page=PER_PAGE,
+        prefetch=not in_background(),
     )
-    if response in (None, TokenExpired, NotFound):
-        return response
-    return response.json()
-
-
-def get_feedback(token: str, portfolio_id: str, goal_id: str) -> Union[List[dict], str]:
-    headers = {"accept": "*/*", "authorization": f"Bearer {token}"}
-    feedback_items: List[dict] = []
-    page = 1
-    seen_ids: set = set()
-
-    while True:
-        response = request_with_retries(
-            f"{BASE_URL}/portfolios/{portfolio_id}/goals/{goal_id}/feedback-items",
-            headers,
-            params={"page": page, "per_page": PER_PAGE},
+    with profiling.span("get_goals", portfolio=portfolio_id):
+        goals: List[dict] = [goal for page in paginator.pages() for goal in page]
+    if paginator.failed:
+        return paginator.error
+    return goals
+
+
+class FeedbackPages:
+    """
+    The feedback items of a goal, fetched page by page while iterating, so
+    only about one page is held at a time.
+
+    Items are always requested newest first (order_by=created_at), so the
+    evaluations of a goal come in the same order whatever the time range.
+    Paging stops early after the first page that reaches items created
+    before `newer_than`, or before the `time_range` start. The latter only
+    holds while the range filter reads created_at, that is while no item
+    seen has an evaluation date of its own: such a date need not follow
+    created_at, so a later page could still be in range. If the pages turn
+    out not to be ordered by created_at, the full history is fetched
+    instead.
+
+    Iterate once. Afterwards `failed` tells whether the history is
+    incomplete, with the api sentinel in `error`; a goal that is not found
+    counts as an empty history.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        portfolio_id: str,
+        goal_id: str,
+        newer_than: Optional[datetime] = None,
+        time_range: Optional[TimeRange] = None,
+    ) -> None:
+        self.token = token
+        self.portfolio_id = portfolio_id
+        self.goal_id = goal_id
+        self.newer_than = newer_than
+        self.lower_bound = time_range.start if time_range is not None else None
+        self.failed = False
+        self.error: Optional[str] = None
+
+    def __iter__(self) -> Iterator[List[dict]]:
+        # Compared as epoch microseconds, see time_range.datetime_epoch_us.
+        newer_than, lower_bound = datetime_epoch_us(self.newer_than), datetime_epoch_us(self.lower_bound)
+        params: Dict[str, Any] = {"order_by": "created_at", "order_direction": "desc"}
+        ordered = newer_than is not None or lower_bound is not None
+        # Whether the range filter has read created_at for every item so far.
+        by_created = lower_bound is not None
+        previous: Optional[int] = None
+
+        paginator = Paginator(
+            _page_fetcher(
+                f"/portfolios/{self.portfolio_id}/goals/{self.goal_id}/feedback-items", self.token, "feedback", params
+            ),
+            endpoint="feedback",
+            per_page=PER_PAGE,
+            # Early stopping needs pages in order; prefetching would waste requests.
+            # Background work (see background()) also fetches one page at a time.
+            prefetch=not ordered and not in_background(),
+            # Only the fields the exporter reads are kept of each item.
+            decode=lambda response: decode_feedback_page(response.content),
         )
 
-        if response == NotFound:
-            return []
-
-        if response in (None, TokenExpired):
-            return TokenExpired
-
-        data = response.json()
-        if not data:
-            break
-
-        new_count = 0
-        for item in data:
-            item_id = item.get("id") if isinstance(item, dict) else None
-            if item_id is None or item_id not in seen_ids:
-                feedback_items.append(item)
-                new_count += 1
-                if item_id is not None:
-                    seen_ids.add(item_id)
-
-        if new_count == 0:
-            break
-        page += 1
-
+        items = 0
+        # Includes the time the consumer spends on each page.
+        with profiling.span("get_feedback", goal=self.goal_id) as span_args:
+            for data in paginator.pages():
+                items += len(data)
+                yield data
+
+                if ordered:
+                    reached = older = False
+                    for item in data:
+                        created = created_timestamp(item) if isinstance(item, dict) else None
+                        if created is None or (previous is not None and created > previous):
+                            # Ordering can't be trusted; fall back to the full history.
+                            ordered = False
+                            break
+                        previous = created
+                        if newer_than is not None and created < newer_than:
+                            reached = True
+                        if by_created and (has_evaluation_date(item) or evaluation_timestamp(item) != created):
+                            by_created = False
+                        if lower_bound is not None and created < lower_bound:
+                            older = True
+                    if ordered and (reached or (by_created and older)):
+                        break
+            span_args["items"] = items
+
+        if paginator.failed and paginator.error != NotFound:
+            self.failed = True
+            self.error = paginator.error
+
+
+def get_feedback(
+    token: str,
+    portfolio_id: str,
+    goal_id: str,
+    newer_than: Optional[datetime] = None,
+    time_range: Optional[TimeRange] = None,
+) -> Union[List[dict], str, None]:
+    """All feedback items of a goal as one list; see FeedbackPages."""
+    pages = FeedbackPages(token, portfolio_id, goal_id, newer_than, time_range)
+    feedback_items = [item for page in pages for item in page]
+    if pages.failed:
+        return pages.error
     return feedback_items
-
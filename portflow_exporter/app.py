@@ -1,15 +1,32 @@
 from __future__ import annotations
 
 import argparse
-from typing import Optional
-
-from . import api, cli, logic
-from .exporters import export_csv_wide
+import sqlite3
+import sys
+from contextlib import nullcontext
+from typing import Optional, Tuple, Union
+
+from . import api, cli, decoding, logic, profiling
+from .archive import ResponseArchive
+from .constants import BASE_URL, MAX_CONNECTIONS
+from .exporters import StreamingCsvWriter
+from .feedback_store import FeedbackStore
+from .http_cache import HttpCache
+from .journal import CheckpointJournal, default_journal_path, export_fingerprint
+from .prefetch import MetadataPrefetcher, StudentPrefetcher
+from .session_cache import SessionCache
+from .sharding import ShardWriter, parse_shard, partial_path, select_shard
 from .time_range import TimeRange, range_between_dates, range_last_days, range_since_date
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(add_help=True)
+    parser = argparse.ArgumentParser(
+        add_help=True,
+        epilog=(
+            "Run with `batch --help` to export several sections at once without the menu, "
+            "and `merge --help` to combine the partial files of a --shard export."
+        ),
+    )
     parser.add_argument("--token", type=str, default=None, help="Bearer token (optional).")
     parser.add_argument(
         "--token-file",
@@ -36,6 +53,103 @@ def build_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument("--days", type=int, default=None, help="Used with --time-range last")
     parser.add_argument("--start-date", type=str, default=None, help="Used with --time-range between/since (YYYY-MM-DD)")
     parser.add_argument("--end-date", type=str, default=None, help="Used with --time-range between (YYYY-MM-DD)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of parallel requests when collecting evaluations (default: 1).",
+    )
+    parser.add_argument("--base-url", type=str, default=BASE_URL, help="Portflow API base URL (e.g. a local mock server).")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk HTTP response cache.")
+    parser.add_argument(
+        "--cache-file",
+        type=str,
+        default=None,
+        help="Path to the HTTP cache database. Defaults to APPDATA\\PortflowExport\\http_cache.sqlite3.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep a local copy of feedback items and only download items newer than the last run.",
+    )
+    parser.add_argument(
+        "--store-file",
+        type=str,
+        default=None,
+        help="Path to the incremental feedback store. Defaults to APPDATA\\PortflowExport\\feedback_store.sqlite3.",
+    )
+    parser.add_argument(
+        "--full-sync",
+        action="store_true",
+        help="With --incremental: download the full history once and replace the local copy.",
+    )
+    parser.add_argument(
+        "--prefetch-students",
+        action="store_true",
+        help="In single-student mode, quietly fetch the other students of the list in the background.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted CSV export, skipping students that were already processed.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=str,
+        default=None,
+        metavar="I/N",
+        help="Export only shard I of N of the students (by student id) to a partial file; combine with `merge`.",
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=["auto"] + list(decoding.BACKENDS),
+        default="auto",
+        help="JSON library for feedback pages (default: the fastest installed of msgspec, orjson, json).",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Save every API response of this run to DIR, for replaying later with --replay.",
+    )
+    recording.add_argument(
+        "--replay",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Serve all API responses from a --record directory, without network access.",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="portflow_trace.json",
+        default=None,
+        metavar="PATH",
+        help="Write a Chrome/Perfetto/speedscope trace of the run's phases (default: portflow_trace.json).",
+    )
+    parser.add_argument(
+        "--profile-cpu",
+        action="store_true",
+        help="With --profile: also run cProfile on the main thread (written to PATH.prof).",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile: also trace memory with tracemalloc (heap counter in the trace, PATH.memory.txt).",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print request statistics (counts, latency, retries, cache hits) at the end and write them as JSON.",
+    )
+    parser.add_argument(
+        "--stats-file",
+        type=str,
+        default="portflow_stats.json",
+        help="Where --stats writes its JSON report (default: portflow_stats.json).",
+    )
     return parser
 
 
@@ -60,6 +174,17 @@ def _time_range_from_args(args: argparse.Namespace) -> TimeRange:
 
 
 def run(argv: Optional[list[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["batch"]:
+        from . import batch
+
+        return batch.run(argv[1:])
+    if argv[:1] == ["merge"]:
+        from .sharding import run_merge
+
+        return run_merge(argv[1:])
+
     parser = build_arg_parser()
     args = parser.parse_args(argv)
 
@@ -69,14 +194,107 @@ def run(argv: Optional[list[str]] = None) -> int:
         print(f"Invalid time range arguments: {e}")
         return 2
 
-    print("\nTip: copy a request as cURL in your browser and paste it when prompted.\n")
+    if args.workers < 1:
+        print("--workers must be >= 1")
+        return 2
+
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            print(f"Invalid --shard: {e}")
+            return 2
 
-    token = cli.prompt_token(
-        provided_token=args.token,
-        allow_env=not args.no_env_token,
-        token_file=args.token_file,
-        save=args.save_token,
+    try:
+        decoding.set_backend(args.json_backend)
+    except ValueError as e:
+        print(f"Invalid --json-backend: {e}")
+        return 2
+
+    if args.incremental and (args.record or args.replay):
+        print("--incremental cannot be combined with --record/--replay")
+        return 2
+
+    archive = None
+    if args.record or args.replay:
+        try:
+            archive = ResponseArchive(args.replay or args.record, replay=args.replay is not None)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Cannot open recording: {e}")
+            return 2
+        if archive.replaying:
+            print(f"Replaying {len(archive)} responses recorded {archive.created_at} from {archive.directory}.")
+
+    # A replay never touches the network, so the HTTP cache would only add disk I/O.
+    cache = None if args.no_cache or args.replay else HttpCache(args.cache_file)
+    api.configure_client(
+        base_url=args.base_url,
+        max_connections=max(MAX_CONNECTIONS, args.workers),
+        cache=cache,
+        archive=archive,
     )
+    store = FeedbackStore(args.store_file, full_refresh=args.full_sync) if args.incremental else None
+
+    profiler = None
+    if args.profile or args.profile_cpu or args.profile_memory:
+        profiler = profiling.Profiler(
+            args.profile or "portflow_trace.json", cpu=args.profile_cpu, memory=args.profile_memory
+        )
+        profiler.start()
+
+    try:
+        # Goals and evaluations fetched in this session are reused when the same
+        # students are looked up or exported again with other filters.
+        return _run_menu(args, time_range, store, SessionCache(), shard)
+    finally:
+        if archive is not None and not archive.replaying:
+            print(f"Recording saved to {archive.directory} ({len(archive)} responses).")
+        elif archive is not None and archive.missing:
+            print(f"{archive.missing} requests were not in the recording and were treated as not found.")
+        if profiler is not None:
+            written = profiler.stop()
+            print(f"Profile written to {', '.join(written)}")
+        if args.stats:
+            _report_stats(args.stats_file)
+
+
+def _report_stats(path: str) -> None:
+    metrics = api.request_metrics()
+    print()
+    for line in metrics.summary_lines():
+        print(line)
+    try:
+        metrics.write_report(path, {"concurrency": api.concurrency_stats(), "json_backend": decoding.backend_name()})
+    except OSError as e:
+        print(f"Could not write stats report to {path}: {e}")
+        return
+    print(f"Stats report written to {path}")
+
+
+def _run_menu(
+    args: argparse.Namespace,
+    time_range: TimeRange,
+    store: Optional[FeedbackStore],
+    session: SessionCache,
+    shard: Optional[Tuple[int, int]] = None,
+) -> int:
+    if args.replay:
+        # Replayed responses are keyed without the token, so none is needed.
+        token = args.token or "replay"
+    else:
+        print("\nTip: copy a request as cURL in your browser and paste it when prompted.\n")
+
+        token = cli.prompt_token(
+            provided_token=args.token,
+            allow_env=not args.no_env_token,
+            token_file=args.token_file,
+            save=args.save_token,
+        )
+
+    # Sections and shared collections load while the user picks from the menu.
+    prefetcher = MetadataPrefetcher(token)
+    student_prefetcher: Optional[StudentPrefetcher] = None
 
     while True:
         method_label = cli.choose_student_fetch_method()
@@ -94,7 +312,8 @@ def run(argv: Optional[list[str]] = None) -> int:
         students = None
 
         if method == "shared":
-            shared = api.get_shared_collections(token)
+            with profiling.span("roster", source="shared"):
+                shared = prefetcher.shared_collections(token)
             if shared == api.TokenExpired:
                 print("Token expired, please enter a new one.")
                 token = cli.prompt_token(
@@ -104,13 +323,13 @@ def run(argv: Optional[list[str]] = None) -> int:
                     save=args.save_token,
                 )
                 continue
-            if shared is None:
+            if shared in (None, api.NotFound):
                 print("Failed to fetch shared collections. Please try again.")
                 continue
             students = logic.extract_students(shared)  # type: ignore[arg-type]
 
         elif method == "section_select":
-            section_id = cli.select_section_id(token)
+            section_id = cli.select_section_id(token, prefetcher.sections(token))
             if section_id == api.TokenExpired:
                 print("Token expired, please enter a new one.")
                 token = cli.prompt_token(
@@ -122,7 +341,8 @@ def run(argv: Optional[list[str]] = None) -> int:
                 continue
             if section_id is None:
                 continue
-            students = api.get_students_from_section(token, section_id)
+            with profiling.span("roster", source="section"):
+                students = api.get_students_from_section(token, section_id)
             if students == api.TokenExpired:
                 print("Token expired, please enter a new one.")
                 token = cli.prompt_token(
@@ -138,7 +358,8 @@ def run(argv: Optional[list[str]] = None) -> int:
 
         else:
             section_id = input("Enter section_id: ").strip()
-            students = api.get_students_from_section(token, section_id)
+            with profiling.span("roster", source="section"):
+                students = api.get_students_from_section(token, section_id)
             if students == api.TokenExpired:
                 print("Token expired, please enter a new one.")
                 token = cli.prompt_token(
@@ -173,6 +394,16 @@ def run(argv: Optional[list[str]] = None) -> int:
         if out_label == "Main menu":
             continue
 
+        if out_label == "Single student" and args.prefetch_students:
+            # Warm up the rest of the roster while the user types a name.
+            if student_prefetcher is None or not student_prefetcher.matches(token, students):
+                if student_prefetcher is not None:
+                    student_prefetcher.stop()
+                student_prefetcher = StudentPrefetcher(token, students, session, store)
+        elif student_prefetcher is not None:
+            student_prefetcher.stop()
+            student_prefetcher = None
+
         include_reviewer = cli.prompt_include_reviewer()
 
         if out_label == "Single student":
@@ -181,7 +412,22 @@ def run(argv: Optional[list[str]] = None) -> int:
                 print("Student not found.")
                 continue
 
-            results = logic.collect_results(token, name, students[name], include_reviewer, time_range)
+            with student_prefetcher.foreground() if student_prefetcher is not None else nullcontext():
+                results = logic.collect_results(
+                    token,
+                    name,
+                    students[name],
+                    include_reviewer,
+                    time_range,
+                    workers=args.workers,
+                    store=store,
+                    session=session,
+                )
+            if student_prefetcher is not None:
+                student_prefetcher.focus(name)
+            if results == api.RequestFailed:
+                print("The API keeps failing for this student; please try again later.")
+                continue
             if results == api.TokenExpired:
                 print("Token expired, please enter a new one.")
                 token = cli.prompt_token(
@@ -197,14 +443,7 @@ def run(argv: Optional[list[str]] = None) -> int:
                 continue
 
             print(f"\n{name}")
-            goals: dict = {}
-            for r in results:
-                goal = r["goal_name"]
-                if include_reviewer:
-                    eval_str = f"{r['evaluation']} ({r['reviewer_name']})"
-                else:
-                    eval_str = r["evaluation"]
-                goals.setdefault(goal, []).append(eval_str)
+            goals = results.by_goal(include_reviewer)  # type: ignore[union-attr]
 
             from .exporters import sort_goals
 
@@ -212,29 +451,105 @@ def run(argv: Optional[list[str]] = None) -> int:
                 print(f"{goal}: {', '.join(goals[goal])}")
 
         else:
-            all_results = []
+            csv_path = "results.csv"
+            roster = list(students)
+            if shard is not None:
+                students = select_shard(students, *shard)
+                csv_path = partial_path(*shard)
+                print(f"\nShard {shard[0]}/{shard[1]}: {len(students)} of {len(roster)} students.")
+
+            journal = CheckpointJournal(
+                default_journal_path(csv_path),
+                export_fingerprint(students.keys(), include_reviewer, time_range),
+            )
+            if not args.resume and journal.has_unfinished():
+                print("Found an unfinished export with the same settings; starting over (use --resume to continue it).")
+            done = journal.open(time_range, resume=args.resume)
+            if done:
+                time_range = journal.time_range or time_range
+                print(f"Resuming export: {len(done)}/{len(students)} students already done.")
+
+            # Rows go to disk as students finish; journaled students are written first.
+            writer: Union[StreamingCsvWriter, ShardWriter]
+            if shard is not None:
+                writer = ShardWriter(csv_path, *shard, roster, list(students), include_reviewer, time_range)
+            else:
+                writer = StreamingCsvWriter(csv_path, include_reviewer=include_reviewer)
+            for name in students:
+                if name in done:
+                    writer.write_student(name, done[name])
+            finished = set(done)
+            done.clear()
+
             total = len(students)
-            processed = 0
-            for name, data in students.items():
-                processed += 1
-                print(f"Processing {name}... ({processed}/{total})")
-                res = logic.collect_results(token, name, data, include_reviewer, time_range)
-                if res == api.TokenExpired:
+            processed = len(finished)
+            try:
+                while len(finished) < total:
+                    remaining = {name: data for name, data in students.items() if name not in finished}
+                    expired = False
+                    for name, res in logic.iter_student_results(
+                        token,
+                        remaining,
+                        include_reviewer,
+                        time_range,
+                        workers=args.workers,
+                        store=store,
+                        session=session,
+                    ):
+                        if res == api.RequestFailed:
+                            # Not a token problem: stop and leave the rest for --resume.
+                            break
+                        if res == api.TokenExpired:
+                            expired = True
+                            break
+                        processed += 1
+                        print(f"Processed {name} ({processed}/{total})")
+                        journal.record(name, res)  # type: ignore[arg-type]
+                        writer.write_student(name, res)  # type: ignore[arg-type]
+                        finished.add(name)
+
+                    if not expired:
+                        break
                     print("Token expired, please enter a new one.")
+                    old_token = token
                     token = cli.prompt_token(
                         provided_token=args.token,
                         allow_env=not args.no_env_token,
                         token_file=args.token_file,
                         save=args.save_token,
                     )
-                    break
-                if res:
-                    all_results.extend(res)
+                    if token == old_token:
+                        break
+                    print("Continuing with the remaining students...")
+            except KeyboardInterrupt:
+                writer.close()
+                journal.close()
+                print(f"\nInterrupted. Progress saved to {journal.path}; run again with --resume to continue.")
+                return 130
+
+            writer.close()
+            journal.close()
+            if len(finished) < total:
+                print(
+                    f"Export incomplete ({writer.path} holds the students done so far). "
+                    f"Progress saved to {journal.path}; run again with --resume to continue."
+                )
+                continue
+
+            if args.workers > 1:
+                stats = api.concurrency_stats()
+                print(
+                    f"API: {stats['completed']} requests, concurrency limit {stats['limit']}, "
+                    f"~{stats['requests_per_second']} requests/s at the end."
+                )
+            if shard is not None:
+                print(f"Shard {shard[0]}/{shard[1]} written to {writer.path}; combine all shards with `merge`.")
+            elif writer.rows_written:
+                print(f"CSV exported to {writer.path}")
             else:
-                if all_results:
-                    export_csv_wide(all_results, include_reviewer)
-                else:
-                    print("\nNo evaluation data found for any student.")
+                writer.discard()
+                print("\nNo evaluation data found for any student.")
+            journal.discard()
 
 
 def main() -> None:
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .http_cache import cache_key, kept_headers
+
+ARCHIVE_FILE = "responses.sqlite3"
+
+
+class ResponseArchive:
+    """
+    Recording of API responses for `--record DIR` / `--replay DIR`.
+
+    Keyed by path and query (not base URL or token), so a recording can be
+    replayed against any --base-url and without a valid token. Bodies are
+    zlib-compressed in a single SQLite file. Only final answers are kept:
+    successful responses and 404s. Retries, 401s and failures are not.
+    """
+
+    def __init__(self, directory: Union[str, Path], replay: bool = False) -> None:
+        self.directory = Path(directory)
+        self.path = self.directory / ARCHIVE_FILE
+        self.replaying = replay
+        self.missing = 0
+        self._lock = threading.Lock()
+
+        if replay:
+            if not self.path.exists():
+                raise FileNotFoundError(f"No recording found at {self.path}")
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if not replay:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (name, value) VALUES ('created_at', ?)",
+                (time.strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def created_at(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'created_at'").fetchone()
+        return row[0] if row else None
+
+    def record(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        endpoint: Optional[str],
+        response: Optional[requests.Response],
+    ) -> None:
+        # `response` None records a 404.
+        if response is None:
+            status, headers, body = 404, {}, b""
+        else:
+            status = 200
+            # Headers the exporter looks at; everything else is dropped on record.
+            headers = kept_headers(response.headers)
+            body = response.content
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses (key, endpoint, status, headers, body, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    cache_key(path, params),
+                    endpoint or "",
+                    status,
+                    json.dumps(headers),
+                    zlib.compress(body, 6),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def replay(self, path: str, params: Optional[Dict[str, Any]]) -> Optional[requests.Response]:
+        key = cache_key(path, params)
+        with self._lock:
+            row = self._conn.execute("SELECT status, headers, body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None and str((params or {}).get("page", 1)) not in ("", "1"):
+                # The recorded run never asked for this page, so it knew the
+                # list had ended; page-size probes and hints can differ
+                # between runs (e.g. another worker order), so answer with an
+                # empty page instead of "not found".
+                row = (200, "{}", zlib.compress(b"[]"))
+            elif row is None:
+                self.missing += 1
+                if self.missing == 1:
+                    print(f"Not in the recording (treated as not found): {key}")
+                return None
+
+        status, headers, body = row
+        response = requests.Response()
+        response.status_code = status
+        response.url = key
+        response._content = zlib.decompress(body)
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
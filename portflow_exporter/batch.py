@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import argparse
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from . import api, cli, decoding, logic
+from .constants import BASE_URL, MAX_CONNECTIONS
+from .exporters import StreamingCsvWriter
+from .feedback_store import FeedbackStore
+from .http_cache import HttpCache
+from .results import ResultSet
+from .session_cache import SessionCache
+
+CATEGORIES = ("Coaches", "Gildes", "Misc")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="portflow_export.py batch",
+        description="Export several sections at once, fetching every portfolio only once.",
+    )
+    parser.add_argument("--sections", nargs="+", default=[], metavar="ID", help="Section IDs to export.")
+    parser.add_argument(
+        "--category",
+        action="append",
+        choices=CATEGORIES,
+        default=[],
+        help="Export every section of a category (can be repeated).",
+    )
+    parser.add_argument("--output-dir", type=str, default=".", help="Directory for the per-section CSV files.")
+    parser.add_argument("--include-reviewer", action="store_true", help="Add the reviewer name to each evaluation.")
+    parser.add_argument("--token", type=str, default=None, help="Bearer token (optional).")
+    parser.add_argument("--token-file", type=str, default=None, help="Path to a cached token file (optional).")
+    parser.add_argument(
+        "--no-env-token",
+        action="store_true",
+        help="Do not read token from PORTFLOW_BEARER_TOKEN environment variable.",
+    )
+    parser.add_argument(
+        "--time-range",
+        choices=["all", "last", "between", "since"],
+        default="all",
+        help="Filter evaluations by time range (default: all).",
+    )
+    parser.add_argument("--days", type=int, default=None, help="Used with --time-range last")
+    parser.add_argument("--start-date", type=str, default=None, help="Used with --time-range between/since (YYYY-MM-DD)")
+    parser.add_argument("--end-date", type=str, default=None, help="Used with --time-range between (YYYY-MM-DD)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of parallel requests when collecting evaluations (default: 4).",
+    )
+    parser.add_argument("--base-url", type=str, default=BASE_URL, help="Portflow API base URL (e.g. a local mock server).")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk HTTP response cache.")
+    parser.add_argument("--cache-file", type=str, default=None, help="Path to the HTTP cache database.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep a local copy of feedback items and only download items newer than the last run.",
+    )
+    parser.add_argument("--store-file", type=str, default=None, help="Path to the incremental feedback store.")
+    parser.add_argument(
+        "--json-backend",
+        choices=["auto"] + list(decoding.BACKENDS),
+        default="auto",
+        help="JSON library for feedback pages (default: the fastest installed of msgspec, orjson, json).",
+    )
+    return parser
+
+
+def csv_filename(section: dict) -> str:
+    name = re.sub(r"[^\w-]+", "_", section.get("name") or "").strip("_")
+    return f"section_{section['id']}_{name}.csv" if name else f"section_{section['id']}.csv"
+
+
+def resolve_sections(
+    token: str, section_ids: List[str], categories: List[str]
+) -> Union[List[dict], str, None]:
+    """The sections to export, in the order given; category members sorted by name."""
+    known: Dict[str, dict] = {}
+    if categories or section_ids:
+        sections = api.get_all_sections(token)
+        if sections == api.TokenExpired:
+            return api.TokenExpired
+        if isinstance(sections, list):
+            known = {str(section["id"]): section for section in sections}
+        elif categories:
+            return None
+
+    selected: Dict[str, dict] = {}
+    for section_id in section_ids:
+        # Sections outside the list (e.g. not visible to this account) are still tried.
+        selected.setdefault(section_id, known.get(section_id, {"id": section_id, "name": ""}))
+    if categories:
+        grouped = cli.categorize_sections(list(known.values()))
+        for category in categories:
+            for section in grouped[category]:
+                selected.setdefault(str(section["id"]), section)
+    return list(selected.values())
+
+
+def portfolio_work_set(rosters: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """
+    One roster entry per unique portfolio over all sections, in order of
+    first appearance, shaped like a student so logic.iter_student_results
+    can fetch it.
+    """
+    work: Dict[str, dict] = {}
+    for students in rosters:
+        for data in students.values():
+            for portfolio_id in data["portfolio_ids"]:
+                work.setdefault(portfolio_id, {"student_id": data.get("student_id"), "portfolio_ids": {portfolio_id}})
+    return work
+
+
+class _SectionOutput:
+    """Writes one section's rows in roster order as their portfolios arrive."""
+
+    def __init__(self, section: dict, students: Dict[str, dict], path: str, include_reviewer: bool) -> None:
+        self.section = section
+        self.pending: List[Tuple[str, dict]] = list(students.items())
+        self.writer = StreamingCsvWriter(path, include_reviewer=include_reviewer)
+
+    def flush(self, results: Dict[str, ResultSet], refs: Dict[str, int]) -> None:
+        while self.pending:
+            name, data = self.pending[0]
+            if any(pid not in results for pid in data["portfolio_ids"]):
+                return
+            rows = ResultSet(self.writer.include_reviewer)
+            for portfolio_id in data["portfolio_ids"]:
+                rows.extend(results[portfolio_id], student_name=name)
+                refs[portfolio_id] -= 1
+                if not refs[portfolio_id]:
+                    del results[portfolio_id]
+            self.writer.write_student(name, rows)
+            self.pending.pop(0)
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    # Shares the time-range validation with the interactive command.
+    from .app import _time_range_from_args
+
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    if not args.sections and not args.category:
+        parser.error("give --sections and/or --category")
+    try:
+        time_range = _time_range_from_args(args)
+    except ValueError as e:
+        print(f"Invalid time range arguments: {e}")
+        return 2
+    if args.workers < 1:
+        print("--workers must be >= 1")
+        return 2
+    try:
+        decoding.set_backend(args.json_backend)
+    except ValueError as e:
+        print(f"Invalid --json-backend: {e}")
+        return 2
+
+    api.configure_client(
+        base_url=args.base_url,
+        max_connections=max(MAX_CONNECTIONS, args.workers),
+        cache=None if args.no_cache else HttpCache(args.cache_file),
+    )
+    store = FeedbackStore(args.store_file) if args.incremental else None
+    token = cli.prompt_token(
+        provided_token=args.token,
+        allow_env=not args.no_env_token,
+        token_file=args.token_file,
+    )
+
+    sections = resolve_sections(token, args.sections, args.category)
+    if sections == api.TokenExpired:
+        print("Token expired; export stopped.")
+        return 1
+    if not sections:
+        print("No sections to export.")
+        return 1
+
+    rosters: List[Tuple[dict, Dict[str, dict]]] = []
+    for section in sections:  # type: ignore[union-attr]
+        label = section.get("name") or section["id"]
+        students = api.get_students_from_section(token, str(section["id"]))
+        if students == api.TokenExpired:
+            print("Token expired; export stopped.")
+            return 1
+        if not isinstance(students, dict):
+            # None, or a sentinel like api.NotFound for a section id that does not exist.
+            print(f"Failed to fetch students of {label}; skipped.")
+            continue
+        print(f"{label}: {len(students)} students")
+        rosters.append((section, students))
+
+    work = portfolio_work_set([students for _, students in rosters])
+    refs: Dict[str, int] = {}
+    for _, students in rosters:
+        for data in students.values():
+            for portfolio_id in data["portfolio_ids"]:
+                refs[portfolio_id] = refs.get(portfolio_id, 0) + 1
+    references = sum(refs.values())
+    print(
+        f"\n{len(rosters)} sections, {sum(len(s) for _, s in rosters)} students, "
+        f"{len(work)} unique portfolios ({references - len(work)} duplicates skipped)."
+    )
+    print(f"Active time filter: {time_range.describe()}\n")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    outputs = [
+        _SectionOutput(section, students, os.path.join(args.output_dir, csv_filename(section)), args.include_reviewer)
+        for section, students in rosters
+    ]
+
+    results: Dict[str, ResultSet] = {}
+    done: Set[str] = set()
+    expired = False
+    failed = False
+    try:
+        for portfolio_id, res in logic.iter_student_results(
+            token,
+            work,
+            args.include_reviewer,
+            time_range,
+            workers=args.workers,
+            store=store,
+            session=SessionCache(),
+        ):
+            if res == api.TokenExpired:
+                expired = True
+                break
+            if res == api.RequestFailed:
+                failed = True
+                break
+            results[portfolio_id] = res  # type: ignore[assignment]
+            done.add(portfolio_id)
+            print(f"Processed portfolio {portfolio_id} ({len(done)}/{len(work)})")
+            for output in outputs:
+                output.flush(results, refs)
+    finally:
+        for output in outputs:
+            output.writer.close()
+
+    for output in outputs:
+        label = output.section.get("name") or output.section["id"]
+        if output.pending:
+            print(f"{label}: incomplete, {output.writer.rows_written} students written to {output.writer.path}")
+        elif output.writer.rows_written:
+            print(f"{label}: exported to {output.writer.path}")
+        else:
+            output.writer.discard()
+            print(f"{label}: no evaluation data found")
+
+    if expired:
+        print("Token expired; export stopped.")
+        return 1
+    if failed:
+        print("Requests keep failing; export stopped.")
+        return 1
+    return 0
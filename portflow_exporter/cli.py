@@ -5,9 +5,10 @@ import importlib
 import os
 import re
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 from . import api
+from .paths import data_dir
 from .time_range import TimeRange, range_between_dates, range_last_days, range_since_date
 
 
@@ -26,11 +27,7 @@ class CliChoice:
 
 
 def _default_token_cache_path() -> Path:
-    # Use a per-user roaming directory on Windows when available.
-    appdata = os.environ.get("APPDATA")
-    if appdata:
-        return Path(appdata) / "PortflowExport" / "token.txt"
-    return Path.home() / ".portflowexport" / "token.txt"
+    return data_dir() / "token.txt"
 
 
 def _read_token_file(path: Path) -> Optional[str]:
@@ -170,8 +167,9 @@ def categorize_sections(sections: List[dict]) -> Dict[str, List[dict]]:
     return categories
 
 
-def select_section_id(token: str) -> Optional[str]:
-    sections = api.get_all_sections(token, use_cache=True)
+def select_section_id(token: str, sections: Union[List[dict], str, None] = None) -> Optional[str]:
+    if sections is None:
+        sections = api.get_all_sections(token, use_cache=True)
     if sections == api.TokenExpired:
         return api.TokenExpired  # type: ignore[return-value]
     if not sections:
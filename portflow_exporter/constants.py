@@ -1,5 +1,38 @@
 BASE_URL = "https://portfolio.drieam.app/api/v1"
 PER_PAGE = 200
+REQUEST_TIMEOUT = 15
+MAX_CONNECTIONS = 10
+# Pages fetched concurrently when the total page count is known up front.
+MAX_PREFETCH_PAGES = 4
+
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+# Total retries allowed per run before failing requests give up immediately.
+RETRY_BUDGET = 200
+# The breaker opens when this many of the last CIRCUIT_BREAKER_WINDOW requests
+# failed (and at least half of them).
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_WINDOW = 20
+CIRCUIT_BREAKER_COOLDOWN = 30.0
+
+# Seconds a cached response is served without asking the server; after that it
+# is revalidated with If-None-Match / If-Modified-Since.
+CACHE_TTLS = {
+    "goals": 24 * 3600,
+    "students": 300,
+    "shared": 300,
+    "feedback": 0,
+}
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# In-session cache of goals and evaluations (interactive re-lookups/re-exports).
+SESSION_CACHE_MAX_EVALUATIONS = 500_000
+SESSION_CACHE_TTL = 15 * 60
+# Distinct level sets whose id -> label map is kept (see levels.LevelIndex).
+LEVEL_INDEX_MAX_SETS = 4096
+# Background threads for --prefetch-students.
+STUDENT_PREFETCH_WORKERS = 2
 
 GOAL_ORDER = [
     "Overzicht creëren",
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypedDict
+
+from . import profiling
+
+# Fields of a feedback item the exporter reads (see logic.evaluations and the
+# time_range pickers); everything else, like the comment body, is dropped.
+_DATE_KEYS = (
+    "date",
+    "evaluation_date",
+    "evaluationDate",
+    "created_at",
+    "submitted_at",
+    "updated_at",
+    "createdAt",
+    "submittedAt",
+    "updatedAt",
+)
+ITEM_KEYS = ("id", "type", "role") + _DATE_KEYS
+EVALUATION_KEYS = ("level",) + _DATE_KEYS
+
+# resolve_level only looks for the level the evaluation points at, so that
+# is the one level kept. Items share one list per (id, label).
+_MAX_LEVELS = 4096
+_levels: Dict[Tuple[Any, Any], List[dict]] = {}
+
+
+def _level_set(level_id: Any, levels: Any) -> Any:
+    if not isinstance(levels, list):
+        return levels
+    if not level_id:
+        return []
+    for level in levels:
+        if isinstance(level, dict) and level.get("id") == level_id:
+            label = level.get("label")
+            try:
+                shared = _levels.get((level_id, label))
+            except TypeError:
+                return [level]
+            if shared is None:
+                shared = [{"id": level_id, "label": label}] if "label" in level else [{"id": level_id}]
+                if len(_levels) < _MAX_LEVELS:
+                    shared = _levels.setdefault((level_id, label), shared)
+            return shared
+    return []
+
+
+_ITEM_FIELDS = frozenset(ITEM_KEYS + ("evaluation",))
+_EVALUATION_FIELDS = frozenset(EVALUATION_KEYS + ("level_set", "reviewer"))
+
+
+def project_evaluation(evaluation: Any) -> Any:
+    if type(evaluation) is not dict:
+        return evaluation
+    projected = {key: value for key, value in evaluation.items() if key in _EVALUATION_FIELDS}
+    if "level_set" in projected:
+        projected["level_set"] = _level_set(projected.get("level"), projected["level_set"])
+    reviewer = projected.get("reviewer")
+    if type(reviewer) is dict:
+        projected["reviewer"] = {"name": reviewer["name"]} if "name" in reviewer else {}
+    return projected
+
+
+def project_item(item: Any) -> Any:
+    """A feedback item reduced to the fields the exporter reads (same shape, same `.get` results)."""
+    if type(item) is not dict:
+        return item
+    projected = {key: value for key, value in item.items() if key in _ITEM_FIELDS}
+    if "evaluation" in projected:
+        projected["evaluation"] = project_evaluation(projected["evaluation"])
+    return projected
+
+
+def _project_page(data: Any) -> Any:
+    if type(data) is not list:
+        return data
+    return [project_item(item) for item in data]
+
+
+def _json_decoder() -> Callable[[bytes], Any]:
+    return lambda content: _project_page(json.loads(content))
+
+
+def _orjson_decoder() -> Callable[[bytes], Any]:
+    import orjson
+
+    return lambda content: _project_page(orjson.loads(content))
+
+
+def _msgspec_decoder() -> Callable[[bytes], Any]:
+    # Decoded straight into dicts of the kept fields: the parser skips the
+    # other keys instead of building them, and absent keys stay absent.
+    import msgspec
+
+    Level = TypedDict("Level", {"id": Any, "label": Any}, total=False)
+    Reviewer = TypedDict("Reviewer", {"name": Any}, total=False)
+    Evaluation = TypedDict(
+        "Evaluation",
+        {
+            **{key: Any for key in EVALUATION_KEYS},
+            "level_set": Optional[List[Level]],
+            "reviewer": Optional[Reviewer],
+        },
+        total=False,
+    )
+    Item = TypedDict("Item", {**{key: Any for key in ITEM_KEYS}, "evaluation": Optional[Evaluation]}, total=False)
+    typed = msgspec.json.Decoder(List[Item])
+    generic = msgspec.json.Decoder()
+
+    def decode(content: bytes) -> Any:
+        try:
+            page = typed.decode(content)
+        except msgspec.ValidationError:
+            # Not a list of item objects (an error body, an unexpected shape).
+            return _project_page(generic.decode(content))
+        for item in page:
+            evaluation = item.get("evaluation")
+            if evaluation and "level_set" in evaluation:
+                evaluation["level_set"] = _level_set(evaluation.get("level"), evaluation["level_set"])
+        return page
+
+    return decode
+
+
+BACKENDS: Dict[str, Callable[[], Callable[[bytes], Any]]] = {
+    "msgspec": _msgspec_decoder,
+    "orjson": _orjson_decoder,
+    "json": _json_decoder,
+}
+
+_backend: Optional[Tuple[str, Callable[[bytes], Any]]] = None
+
+
+def set_backend(name: str = "auto") -> str:
+    """
+    Pick the JSON library for feedback pages: "auto" takes the fastest one
+    installed (msgspec, orjson, then the standard library). Returns the name
+    of the backend in use; raises ValueError for one that is not installed.
+    """
+    global _backend
+    names = list(BACKENDS) if name == "auto" else [name]
+    for candidate in names:
+        if candidate not in BACKENDS:
+            raise ValueError(f"unknown JSON backend {candidate!r}")
+        try:
+            _backend = (candidate, BACKENDS[candidate]())
+        except ImportError:
+            if name != "auto":
+                raise ValueError(f"JSON backend {candidate!r} is not installed") from None
+            continue
+        return candidate
+    raise ValueError("no JSON backend available")
+
+
+def backend_name() -> str:
+    if _backend is None:
+        set_backend()
+    return _backend[0]  # type: ignore[index]
+
+
+def decode_feedback_page(content: bytes) -> Any:
+    """A feedback-items page as a list of projected items (see project_item)."""
+    if _backend is None:
+        set_backend()
+    with profiling.span("decode", bytes=len(content)):
+        return _backend[1](content)  # type: ignore[index]
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
 import csv
-from typing import Iterable, List
+import os
+from typing import Dict, Iterable, List, Optional, TextIO
 
-from .constants import GOAL_ORDER_LOWER
+from . import profiling
+from .constants import GOAL_ORDER, GOAL_ORDER_LOWER
+from .results import Results, ResultSet
+
+OTHER_GOALS_COLUMN = "Other goals"
+_GOAL_COLUMNS = {goal: i for i, goal in enumerate(GOAL_ORDER_LOWER)}
 
 
 def sort_goals(goals: Iterable[str]) -> List[str]:
@@ -17,33 +23,58 @@ def sort_goals(goals: Iterable[str]) -> List[str]:
     return sorted(set(goals), key=sort_key)
 
 
-def export_csv_wide(results: list[dict], include_reviewer: bool = False, path: str = "results.csv") -> None:
-    if not results:
-        print("No data to export.")
-        return
+class StreamingCsvWriter:
+    """
+    Wide CSV writer that emits one row per student as soon as it is known.
+
+    The header is fixed up front (GOAL_ORDER plus an "Other goals" column for
+    goals outside that list), so rows never have to be rewritten and the file
+    is usable while the export is still running.
+    """
 
-    all_goals = sort_goals(r["goal_name"] for r in results)
-    students: dict = {}
+    def __init__(self, path: str = "results.csv", include_reviewer: bool = False) -> None:
+        self.path = path
+        self.include_reviewer = include_reviewer
+        self.rows_written = 0
+        self._f: Optional[TextIO] = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._f, delimiter=";")
+        self._writer.writerow(["Studentname"] + GOAL_ORDER + [OTHER_GOALS_COLUMN])
+        self._f.flush()
 
-    for r in results:
-        s = r["student_name"]
-        g = r["goal_name"]
-        students.setdefault(s, {goal: "" for goal in all_goals})
+    def write_student(self, student_name: str, results: Results) -> None:
+        if not results:
+            return
 
-        eval_str = r["evaluation"]
-        if include_reviewer:
-            eval_str += f" ({r.get('reviewer_name', 'Unknown')})"
+        results = ResultSet.from_rows(results)
+        with profiling.span("write_csv_row", student=student_name, results=len(results)):
+            known: List[List[str]] = [[] for _ in GOAL_ORDER]
+            other: Dict[str, List[str]] = {}
+            for goal, labels in results.by_goal(self.include_reviewer).items():
+                column = _GOAL_COLUMNS.get(goal.lower())
+                if column is None:
+                    other.setdefault(goal, []).extend(labels)
+                else:
+                    known[column].extend(labels)
 
-        if students[s][g]:
-            students[s][g] += f", {eval_str}"
-        else:
-            students[s][g] = eval_str
+            other_str = "; ".join(f"{goal}: {', '.join(other[goal])}" for goal in sort_goals(other))
+            self._writer.writerow([student_name] + [", ".join(evals) for evals in known] + [other_str])
+            self._f.flush()  # type: ignore[union-attr]
+        self.rows_written += 1
 
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f, delimiter=";")
-        writer.writerow(["Studentname"] + all_goals)
-        for student, goal_data in students.items():
-            writer.writerow([student] + [goal_data[g] for g in all_goals])
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
 
-    print(f"CSV exported to {path}")
+    def __enter__(self) -> "StreamingCsvWriter":
+        return self
 
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Union
+
+from . import api
+from .decoding import project_item
+from .paths import data_dir
+from .time_range import parse_iso_datetime, pick_created_timestamp
+
+
+def default_store_path() -> Path:
+    return data_dir() / "feedback_store.sqlite3"
+
+
+def _item_key(item: dict) -> str:
+    item_id = item.get("id") if isinstance(item, dict) else None
+    if item_id is not None:
+        return str(item_id)
+    # Items without an id are deduplicated by content.
+    return "sha1:" + hashlib.sha1(json.dumps(item, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class FeedbackStore:
+    """
+    Local copy of feedback items per (portfolio_id, goal_id).
+
+    Each goal keeps a high-water mark (newest `created_at` seen). A sync only
+    pages through the API until it reaches items older than that mark and
+    merges the new ones in, so repeated exports cost one request per goal
+    instead of the full history.
+    """
+
+    def __init__(self, path: Optional[Path] = None, full_refresh: bool = False) -> None:
+        self.path = Path(path) if path else default_store_path()
+        self.full_refresh = full_refresh
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                portfolio_id TEXT NOT NULL,
+                goal_id TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                PRIMARY KEY (portfolio_id, goal_id, item_key)
+            );
+            CREATE TABLE IF NOT EXISTS marks (
+                portfolio_id TEXT NOT NULL,
+                goal_id TEXT NOT NULL,
+                high_water TEXT,
+                PRIMARY KEY (portfolio_id, goal_id)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def high_water(self, portfolio_id: str, goal_id: str) -> Optional[datetime]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water FROM marks WHERE portfolio_id = ? AND goal_id = ?",
+                (str(portfolio_id), str(goal_id)),
+            ).fetchone()
+        return parse_iso_datetime(row[0]) if row else None
+
+    def items(self, portfolio_id: str, goal_id: str) -> List[dict]:
+        # Newest first, matching the order the API returns with order_direction=desc.
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT body FROM items WHERE portfolio_id = ? AND goal_id = ? ORDER BY seq DESC",
+                (str(portfolio_id), str(goal_id)),
+            ).fetchall()
+        # Projected like fresh pages, which also shares the level sets (see levels.LevelIndex).
+        return [project_item(json.loads(body)) for (body,) in rows]
+
+    def merge(self, portfolio_id: str, goal_id: str, new_items: List[dict], replace: bool = False) -> None:
+        pid, gid = str(portfolio_id), str(goal_id)
+        with self._lock:
+            if replace:
+                self._conn.execute("DELETE FROM items WHERE portfolio_id = ? AND goal_id = ?", (pid, gid))
+            top = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM items WHERE portfolio_id = ? AND goal_id = ?",
+                (pid, gid),
+            ).fetchone()[0]
+
+            # new_items arrive newest first; the first one gets the highest seq.
+            # Items already stored keep their position but get the fresh body.
+            for offset, item in enumerate(new_items):
+                key = _item_key(item)
+                body = json.dumps(item, separators=(",", ":"))
+                updated = self._conn.execute(
+                    "UPDATE items SET body = ? WHERE portfolio_id = ? AND goal_id = ? AND item_key = ?",
+                    (body, pid, gid, key),
+                ).rowcount
+                if not updated:
+                    self._conn.execute(
+                        "INSERT INTO items (portfolio_id, goal_id, item_key, seq, body) VALUES (?, ?, ?, ?, ?)",
+                        (pid, gid, key, top + len(new_items) - offset, body),
+                    )
+
+            stamps = [ts for ts in (pick_created_timestamp(item) for item in new_items) if ts is not None]
+            old_row = self._conn.execute(
+                "SELECT high_water FROM marks WHERE portfolio_id = ? AND goal_id = ?", (pid, gid)
+            ).fetchone()
+            old_mark = parse_iso_datetime(old_row[0]) if old_row and not replace else None
+            if old_mark is not None:
+                stamps.append(old_mark)
+            mark = max(stamps).isoformat() if stamps else None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO marks (portfolio_id, goal_id, high_water) VALUES (?, ?, ?)",
+                (pid, gid, mark),
+            )
+            self._conn.commit()
+
+    def sync(self, token: str, portfolio_id: str, goal_id: str) -> Union[List[dict], str, None]:
+        mark = None if self.full_refresh else self.high_water(portfolio_id, goal_id)
+        fetched = api.get_feedback(token, portfolio_id, goal_id, newer_than=mark)
+        if fetched in (None, api.TokenExpired):
+            return fetched
+        self.merge(portfolio_id, goal_id, fetched, replace=mark is None)  # type: ignore[arg-type]
+        return self.items(portfolio_id, goal_id)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
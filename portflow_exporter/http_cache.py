@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .constants import CACHE_TTLS, HTTP_CACHE_MAX_BYTES
+from .paths import data_dir
+
+
+def default_cache_path() -> Path:
+    return data_dir() / "http_cache.sqlite3"
+
+
+# Headers the exporter looks at (content type, validators and the pagination
+# hints the Paginator reads); everything else is dropped on store.
+KEPT_HEADERS = (
+    "content-type",
+    "link",
+    "x-total-count",
+    "x-per-page",
+    "x-total-pages",
+    "total-pages",
+    "total",
+    "per-page",
+    "etag",
+    "last-modified",
+)
+
+SCHEMA_VERSION = 2
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted((str(k), str(v)) for k, v in params.items()))}"
+
+
+def account_key(token: str) -> str:
+    """
+    Who the cached answers belong to: the user id (`sub`) of a JWT bearer
+    token, so a renewed token of the same account keeps its cache, or else a
+    hash of the token. Never the token itself.
+    """
+    parts = token.split(".")
+    if len(parts) == 3:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+            subject = payload.get("sub") if isinstance(payload, dict) else None
+        except ValueError:
+            subject = None
+        if subject is not None:
+            return "sub:" + hashlib.sha256(str(subject).encode("utf-8")).hexdigest()[:16]
+    return "token:" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def kept_headers(headers: Any) -> Dict[str, str]:
+    return {name: headers[name] for name in KEPT_HEADERS if name in headers}
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    url: str
+    body: bytes
+    headers: Dict[str, str]
+    stored_at: float
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if self.headers.get("etag"):
+            headers["if-none-match"] = self.headers["etag"]
+        if self.headers.get("last-modified"):
+            headers["if-modified-since"] = self.headers["last-modified"]
+        return headers
+
+    def to_response(self) -> requests.Response:
+        # Rebuild a Response so callers can keep using .json() / .content / .headers.
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response._content = self.body
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(self.headers)
+        return response
+
+
+class HttpCache:
+    """
+    SQLite-backed cache for GET responses.
+
+    Bodies are stored zlib-compressed, with the KEPT_HEADERS, and evicted
+    least-recently-used once the total stored size exceeds `max_bytes`.
+    Entries younger than the endpoint TTL are served directly; older entries
+    are revalidated with If-None-Match / If-Modified-Since.
+
+    Keys start with the account_key of the token (see api), so one account
+    is never served answers cached for another. A fresh entry is served
+    without a request, so an expired token is only noticed on the next
+    request that does reach the API.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: int = HTTP_CACHE_MAX_BYTES,
+        ttls: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.path = Path(path) if path else default_cache_path()
+        self.max_bytes = max_bytes
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Older caches lack the pagination headers and the account in the key.
+            self._conn.execute("DROP TABLE IF EXISTS responses")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def handles(self, endpoint: Optional[str]) -> bool:
+        return endpoint is not None and endpoint in self.ttls
+
+    def is_fresh(self, endpoint: Optional[str], entry: CachedResponse) -> bool:
+        return time.time() - entry.stored_at < self.ttls.get(endpoint or "", 0)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, headers, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        body, headers, stored_at = row
+        try:
+            body = zlib.decompress(body)
+            headers = json.loads(headers)
+        except (zlib.error, ValueError):
+            self.delete(key)
+            return None
+        return CachedResponse(key, body, headers, stored_at)
+
+    def put(self, key: str, endpoint: Optional[str], response: requests.Response) -> None:
+        body = zlib.compress(response.content, 6)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (key, endpoint, body, size, headers, stored_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, endpoint or "", body, len(body), json.dumps(kept_headers(response.headers)), now, now),
+            )
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._evict_locked()
+            self._conn.commit()
+
+    def refresh(self, key: str, entry: CachedResponse, response: requests.Response) -> CachedResponse:
+        """
+        A 304 means the stored body is still current: restart its TTL and take
+        over the headers the 304 carries (a new ETag, current Link or
+        X-Total-Count). Returns the updated entry.
+        """
+        now = time.time()
+        headers = {**entry.headers, **kept_headers(response.headers)}
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET headers = ?, stored_at = ?, last_used = ? WHERE key = ?",
+                (json.dumps(headers), now, now, key),
+            )
+            self._conn.commit()
+        return replace(entry, headers=headers, stored_at=now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+                self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def _evict_locked(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 64").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
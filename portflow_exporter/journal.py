@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from .time_range import TimeRange, parse_iso_datetime
+
+JOURNAL_VERSION = 1
+
+
+def default_journal_path(csv_path: str = "results.csv") -> Path:
+    return Path(f"{csv_path}.journal")
+
+
+def export_fingerprint(student_names: Iterable[str], include_reviewer: bool, time_range: TimeRange) -> str:
+    # Day granularity, so "last N days" still matches when resuming later that day.
+    parts = [
+        "reviewer" if include_reviewer else "no-reviewer",
+        time_range.start.date().isoformat() if time_range.start else "-",
+        time_range.end.date().isoformat() if time_range.end else "-",
+    ]
+    parts.extend(sorted(student_names))
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL file with the results of every finished student.
+
+    The first line identifies the export (students, reviewer toggle, time
+    range); each following line holds one student's results. A resumed run
+    with the same fingerprint skips the students already in the file.
+    """
+
+    def __init__(self, path: Path, fingerprint: str) -> None:
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.time_range: Optional[TimeRange] = None
+        self._fh: Optional[TextIO] = None
+
+    def _read(self) -> Optional[Dict[str, List[dict]]]:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "null")
+                if not isinstance(header, dict) or header.get("version") != JOURNAL_VERSION:
+                    return None
+                if header.get("fingerprint") != self.fingerprint:
+                    return None
+
+                self.time_range = TimeRange(
+                    start=parse_iso_datetime(header.get("start")),
+                    end=parse_iso_datetime(header.get("end")),
+                )
+                done: Dict[str, List[dict]] = {}
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut off by a crash; everything before it is still valid.
+                        break
+                    done[entry["student"]] = entry["results"]
+                return done
+        except (OSError, ValueError):
+            return None
+
+    def has_unfinished(self) -> bool:
+        return self.path.exists() and self._read() is not None
+
+    def open(self, time_range: TimeRange, resume: bool = False) -> Dict[str, List[dict]]:
+        """Start (or continue, with resume=True) the journal and return the finished students."""
+        done = self._read() if resume else None
+        if done is None:
+            done = {}
+            self.time_range = time_range
+
+        # Rewrite instead of appending so a line cut off by a crash is dropped.
+        tr = self.time_range or time_range
+        self._fh = self.path.open("w", encoding="utf-8")
+        self._write(
+            {
+                "version": JOURNAL_VERSION,
+                "fingerprint": self.fingerprint,
+                "start": tr.start.isoformat() if tr.start else None,
+                "end": tr.end.isoformat() if tr.end else None,
+            },
+            sync=False,
+        )
+        for student_name, results in done.items():
+            self._write({"student": student_name, "results": results}, sync=False)
+        self._sync()
+        return done
+
+    def record(self, student_name: str, results: Iterable[dict]) -> None:
+        self._write({"student": student_name, "results": list(results)})
+
+    def _write(self, entry: dict, sync: bool = True) -> None:
+        if self._fh is None:
+            raise RuntimeError("journal is not open")
+        self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if sync:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .constants import LEVEL_INDEX_MAX_SETS
+from .results import ResultSet
+
+Labels = Dict[Any, Optional[int]]
+
+
+class LevelIndex:
+    """
+    Resolves an evaluation's level to a compact id in ResultSet.levels.
+
+    The items of a goal share one level set, so each distinct set (by its
+    (id, label) pairs) is turned into an id -> label map once. Sets are
+    looked up by list first, as decoding hands out one shared list per
+    level, and only fingerprinted when the list is new. Both lookups keep at
+    most `max_sets` entries.
+    """
+
+    def __init__(self, max_sets: int = LEVEL_INDEX_MAX_SETS) -> None:
+        self.max_sets = max_sets
+        # By id(level_set); _lists keeps those lists alive so no id is reused.
+        self._by_list: Dict[int, Labels] = {}
+        self._lists: Dict[int, list] = {}
+        self._by_fingerprint: Dict[Tuple[Tuple[Any, Any], ...], Labels] = {}
+        self._lock = threading.Lock()
+
+    def _labels(self, level_set: list) -> Optional[Labels]:
+        try:
+            fingerprint = tuple((level.get("id"), level.get("label")) for level in level_set)
+            hash(fingerprint)
+        except (AttributeError, TypeError):
+            return None
+        with self._lock:
+            labels = self._by_fingerprint.get(fingerprint)
+            if labels is None:
+                label_id = ResultSet.levels.id
+                labels = {}
+                for level_id, label in fingerprint:
+                    # Like the scan it replaces, the first level with an id wins.
+                    if level_id not in labels:
+                        labels[level_id] = None if label is None else label_id(label)
+                if len(self._by_fingerprint) >= self.max_sets:
+                    self._by_fingerprint.clear()
+                self._by_fingerprint[fingerprint] = labels
+            if len(self._by_list) >= self.max_sets:
+                self._by_list.clear()
+                self._lists.clear()
+            self._lists[id(level_set)] = level_set
+            self._by_list[id(level_set)] = labels
+        return labels
+
+    def resolve(self, evaluation: dict) -> Optional[int]:
+        level_id = evaluation.get("level")
+        if not level_id:
+            return None
+        level_set = evaluation.get("level_set")
+        labels = self._by_list.get(id(level_set))
+        if labels is None:
+            if type(level_set) is not list:
+                return None
+            labels = self._labels(level_set)
+            if labels is None:
+                return None
+        return labels.get(level_id)
+
+
+# Shared by every export of the process, like the ResultSet string tables.
+level_index = LevelIndex()
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
-from typing import Dict, List, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from . import api
-from .time_range import TimeRange, in_time_range, pick_evaluation_timestamp
+from . import api, profiling
+from .feedback_store import FeedbackStore
+from .levels import level_index
+from .results import ResultSet
+from .session_cache import Evaluation, GoalIndex, SessionCache
+from .time_range import TimeRange, datetime_epoch_us, in_time_range, pick_evaluation_timestamp
 
 
 def extract_students(shared_items: List[dict]) -> Dict[str, dict]:
@@ -23,15 +29,128 @@ def extract_students(shared_items: List[dict]) -> Dict[str, dict]:
 
 
 def resolve_level(evaluation: dict):
-    level_id = evaluation.get("level")
-    if not level_id:
-        return None
+    level = level_index.resolve(evaluation)
+    return None if level is None else ResultSet.levels.strings[level]
 
-    for lvl in evaluation.get("level_set", []):
-        if lvl["id"] == level_id:
-            return lvl["label"]
 
-    return None
+def _full_history(store: Optional[FeedbackStore]) -> bool:
+    return store is not None or api.get_client().archive is not None
+
+
+def fetch_feedback(
+    token: str,
+    portfolio_id: str,
+    goal_id: str,
+    store: Optional[FeedbackStore] = None,
+    time_range: Optional[TimeRange] = None,
+) -> Union[api.FeedbackPages, List[dict], str, None]:
+    """
+    The feedback items of a goal: a list from the incremental store, or the
+    api.FeedbackPages to stream them from the API (or a failure sentinel).
+    """
+    if store is not None:
+        # The store must hold the complete history, so it is synced without the
+        # time range and filtered locally afterwards.
+        return store.sync(token, portfolio_id, goal_id)
+    if api.get_client().archive is not None:
+        # Record/replay always uses the full history, so a recording can be
+        # replayed with any time range (filtering happens locally anyway).
+        time_range = None
+    return api.FeedbackPages(token, portfolio_id, goal_id, time_range=time_range)
+
+
+def fetch_goals(token: str, portfolio_id: str, session: Optional[SessionCache] = None) -> Union[List[dict], str, None]:
+    goals = session.goals(portfolio_id) if session is not None else None
+    if goals is None:
+        goals = api.get_goals(token, portfolio_id)
+        if session is not None and isinstance(goals, list):
+            session.put_goals(portfolio_id, goals)
+    return goals
+
+
+def fetch_goal_index(
+    token: str,
+    portfolio_id: str,
+    goal_id: str,
+    store: Optional[FeedbackStore] = None,
+    time_range: TimeRange = TimeRange(),
+    session: Optional[SessionCache] = None,
+) -> Union[GoalIndex, str, None]:
+    if session is not None:
+        index = session.goal_index(portfolio_id, goal_id, time_range)
+        if index is not None:
+            return index
+
+    feedback = fetch_feedback(token, portfolio_id, goal_id, store, time_range)
+    if isinstance(feedback, api.FeedbackPages):
+        # Items are reduced to evaluations page by page as they arrive.
+        items: Iterable[dict] = (item for page in feedback for item in page)
+    elif isinstance(feedback, list):
+        items = feedback
+    else:
+        return feedback
+    # Without a session cache nothing outside the time range is needed later.
+    found = evaluations(items, time_range if session is None else TimeRange())
+    if isinstance(feedback, api.FeedbackPages) and feedback.failed:
+        return feedback.error
+    index = GoalIndex(found, None if _full_history(store) else time_range.start)
+    if session is not None:
+        session.put_goal_index(portfolio_id, goal_id, index)
+    return index
+
+
+def evaluations(feedback_items: Iterable[dict], time_range: TimeRange = TimeRange()) -> List[Evaluation]:
+    """The criterion evaluations (not self-assessments) among `feedback_items`, in order."""
+    found: List[Evaluation] = []
+    for item in feedback_items:
+        if item.get("type") != "criterion_evaluation":
+            continue
+        if item.get("role") == "self":
+            continue
+
+        dt = pick_evaluation_timestamp(item)
+        if not in_time_range(dt, time_range):
+            continue
+
+        evaluation = item.get("evaluation")
+        if not evaluation:
+            continue
+
+        level = level_index.resolve(evaluation)
+        if level is None:
+            continue
+
+        reviewer = evaluation.get("reviewer") or {}
+        found.append(Evaluation(datetime_epoch_us(dt), level, reviewer.get("name", "Unknown")))
+    return found
+
+
+def goal_results(
+    student_name: str,
+    goal_name: str,
+    feedback_items: List[dict],
+    include_reviewer: bool = False,
+    time_range: TimeRange = TimeRange(),
+) -> ResultSet:
+    with profiling.span("filter", goal=goal_name, items=len(feedback_items)):
+        results = ResultSet(include_reviewer)
+        results.add_evaluations(student_name, goal_name, evaluations(feedback_items, time_range))
+        return results
+
+
+def index_results(
+    student_name: str,
+    goal_name: str,
+    index: GoalIndex,
+    include_reviewer: bool = False,
+    time_range: TimeRange = TimeRange(),
+    into: Optional[ResultSet] = None,
+) -> ResultSet:
+    """The goal's evaluations in `time_range` as results, added to `into` when given."""
+    with profiling.span("filter", goal=goal_name, items=len(index.evaluations)):
+        results = into if into is not None else ResultSet(include_reviewer)
+        results.add_evaluations(student_name, goal_name, index.in_range(time_range))
+        return results
 
 
 def collect_results(
@@ -40,54 +159,191 @@ def collect_results(
     student_data: dict,
     include_reviewer: bool = False,
     time_range: TimeRange = TimeRange(),
-) -> Union[List[dict], str]:
-    results: List[dict] = []
+    workers: int = 1,
+    store: Optional[FeedbackStore] = None,
+    session: Optional[SessionCache] = None,
+) -> Union[ResultSet, str]:
+    if workers > 1:
+        for _, results in iter_student_results(
+            token,
+            {student_name: student_data},
+            include_reviewer,
+            time_range,
+            workers=workers,
+            store=store,
+            session=session,
+        ):
+            return results
+        return ResultSet(include_reviewer)
 
-    for portfolio_id in student_data["portfolio_ids"]:
-        goals = api.get_goals(token, portfolio_id)
+    with profiling.span("collect_results", student=student_name):
+        results = ResultSet(include_reviewer)
+        deferred: List[Tuple[str, dict]] = []
 
-        if goals == api.TokenExpired:
-            return api.TokenExpired
+        for portfolio_id in student_data["portfolio_ids"]:
+            goals = fetch_goals(token, portfolio_id, session)
 
-        if goals in (None, api.NotFound):
-            print(f"  Warning: Cannot access evaluations for {student_name} (no permission or not found)")
-            continue
+            if goals == api.TokenExpired:
+                return api.TokenExpired
 
-        if not goals:
-            continue
+            if goals in (None, api.NotFound):
+                print(f"  Warning: Cannot access evaluations for {student_name} (no permission or not found)")
+                continue
 
-        for goal in goals:
-            goal_id = goal["id"]
-            goal_name = goal["name"]
+            if not goals:
+                continue
 
-            feedback_items = api.get_feedback(token, portfolio_id, goal_id)
-            if feedback_items == api.TokenExpired:
+            for goal in goals:
+                index = fetch_goal_index(token, portfolio_id, goal["id"], store, time_range, session)
+                if index == api.TokenExpired:
+                    return api.TokenExpired
+                if index is None:
+                    # Retry failed goals once more after the rest of the student.
+                    deferred.append((portfolio_id, goal))
+                    continue
+
+                index_results(student_name, goal["name"], index, include_reviewer, time_range, into=results)
+
+        for portfolio_id, goal in deferred:
+            index = fetch_goal_index(token, portfolio_id, goal["id"], store, time_range, session)
+            if index == api.TokenExpired:
                 return api.TokenExpired
+            if not isinstance(index, GoalIndex):
+                print(f"  Requests for {student_name} keep failing; stopping so the export can be resumed.")
+                return api.RequestFailed
+            index_results(student_name, goal["name"], index, include_reviewer, time_range, into=results)
 
-            for item in feedback_items:
-                if item.get("type") != "criterion_evaluation":
-                    continue
-                if item.get("role") == "self":
-                    continue
+        return results
 
-                ts = pick_evaluation_timestamp(item)
-                if not in_time_range(ts, time_range):
-                    continue
 
-                evaluation = item.get("evaluation")
-                if not evaluation:
-                    continue
+def iter_student_results(
+    token: str,
+    students: Dict[str, dict],
+    include_reviewer: bool = False,
+    time_range: TimeRange = TimeRange(),
+    workers: int = 1,
+    store: Optional[FeedbackStore] = None,
+    session: Optional[SessionCache] = None,
+) -> Iterator[Tuple[str, Union[ResultSet, str]]]:
+    """
+    Yield (student_name, results) in the order of `students`.
 
-                level = resolve_level(evaluation)
-                if level is None:
-                    continue
+    With workers > 1, goals and feedback for several students are fetched
+    concurrently; results are still yielded in roster order. When the token
+    expires (or a student's requests keep failing) the affected student is
+    yielded with api.TokenExpired (api.RequestFailed) and the iteration
+    stops, leaving all earlier students' results intact.
+    """
+    if workers <= 1:
+        for name, data in students.items():
+            results = collect_results(token, name, data, include_reviewer, time_range, store=store, session=session)
+            yield name, results
+            if results in (api.TokenExpired, api.RequestFailed):
+                return
+        return
+
+    yield from _iter_student_results_parallel(
+        token, students, include_reviewer, time_range, workers, store, session
+    )
+
+
+def _iter_student_results_parallel(
+    token: str,
+    students: Dict[str, dict],
+    include_reviewer: bool,
+    time_range: TimeRange,
+    workers: int,
+    store: Optional[FeedbackStore],
+    session: Optional[SessionCache],
+) -> Iterator[Tuple[str, Union[ResultSet, str]]]:
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="portflow")
+
+    def feedback_task(portfolio_id: str, goal_id: str):
+        if stop.is_set():
+            return api.TokenExpired
+        # Stopping also cuts short retries and breaker pauses, so shutdown is quick.
+        with api.stop_on(stop):
+            index = fetch_goal_index(token, portfolio_id, goal_id, store, time_range, session)
+        if index == api.TokenExpired:
+            stop.set()
+        return index
+
+    def goals_task(portfolio_id: str):
+        # Workers never wait on other futures; feedback fetches are queued from
+        # here so the pool cannot deadlock on itself.
+        if stop.is_set():
+            return api.TokenExpired, []
+        with api.stop_on(stop):
+            goals = fetch_goals(token, portfolio_id, session)
+        if goals == api.TokenExpired:
+            stop.set()
+            return goals, []
+        if goals is None and stop.is_set():
+            # Cut short by the stop, not an inaccessible portfolio.
+            return api.TokenExpired, []
+        if goals in (None, api.NotFound) or not goals:
+            return goals, []
+        try:
+            pending = [(goal, executor.submit(feedback_task, portfolio_id, goal["id"])) for goal in goals]
+        except RuntimeError:
+            # executor already shut down because the batch was stopped
+            return api.TokenExpired, []
+        return goals, pending
+
+    order = list(students.items())
+    submitted: Dict[int, list] = {}
+    # Only keep a small window of students in flight so memory stays bounded
+    # and the first results arrive early.
+    lookahead = workers * 2
+
+    def submit_student(index: int) -> None:
+        _, data = order[index]
+        submitted[index] = [
+            (portfolio_id, executor.submit(goals_task, portfolio_id)) for portfolio_id in data["portfolio_ids"]
+        ]
 
-                result = {"student_name": student_name, "goal_name": goal_name, "evaluation": level}
-                if include_reviewer:
-                    reviewer = evaluation.get("reviewer", {})
-                    result["reviewer_name"] = reviewer.get("name", "Unknown")
+    try:
+        for index in range(min(lookahead, len(order))):
+            submit_student(index)
 
-                results.append(result)
+        for index, (name, _) in enumerate(order):
+            if index + lookahead < len(order):
+                submit_student(index + lookahead)
 
-    return results
+            # Mostly time spent waiting on the workers for this student.
+            with profiling.span("student", student=name):
+                results = ResultSet(include_reviewer)
+                failure: Optional[str] = None
+                for portfolio_id, goals_future in submitted.pop(index):
+                    goals, pending = goals_future.result()
+                    if goals == api.TokenExpired:
+                        failure = api.TokenExpired
+                        break
+                    if goals in (None, api.NotFound):
+                        print(f"  Warning: Cannot access evaluations for {name} (no permission or not found)")
+                        continue
+                    for goal, feedback_future in pending:
+                        goal_index = feedback_future.result()
+                        if goal_index is None and not stop.is_set():
+                            # Deferred retry: requeue behind the work already in flight.
+                            goal_index = executor.submit(feedback_task, portfolio_id, goal["id"]).result()
+                            if goal_index is None:
+                                print(f"  Requests for {name} keep failing; stopping so the export can be resumed.")
+                                failure = api.RequestFailed
+                                break
+                        if not isinstance(goal_index, GoalIndex):
+                            # Stopped because another worker saw the token expire.
+                            failure = api.TokenExpired
+                            break
+                        index_results(name, goal["name"], goal_index, include_reviewer, time_range, into=results)
+                    if failure is not None:
+                        break
 
+            if failure is not None:
+                yield name, failure
+                return
+            yield name, results
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
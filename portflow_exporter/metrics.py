@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Upper bounds (seconds) of the latency buckets: 1 ms growing by 25% per
+# bucket up to ~2 minutes, so percentiles are within 25% at any scale.
+_BUCKET_BOUNDS: List[float] = []
+_bound = 0.001
+while _bound < 120:
+    _BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.25
+
+
+class LatencyHistogram:
+    """Fixed log-bucket histogram; memory does not grow with the request count."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = pct * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                bound = _BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+class EndpointMetrics:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.statuses: Counter = Counter()
+        # Connection errors and timeouts (no HTTP status).
+        self.errors = 0
+        self.bytes = 0
+        self.retries = 0
+        # Served from the HTTP cache without a request / after a 304.
+        self.cache_hits = 0
+        self.cache_revalidated = 0
+        # Answered by an identical request already in flight.
+        self.coalesced = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "cache_revalidated": self.cache_revalidated,
+            "coalesced": self.coalesced,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class RequestMetrics:
+    """
+    Per-endpoint request statistics for one run.
+
+    Filled in by the api layer: every HTTP request (status, latency, bytes on
+    the wire), every retry and every answer served from the HTTP cache.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc)
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, endpoint: Optional[str]) -> EndpointMetrics:
+        return self._endpoints.setdefault(endpoint or "other", EndpointMetrics())
+
+    def record_response(self, endpoint: Optional[str], status: int, latency: float, size: int) -> None:
+        with self._lock:
+            metrics = self._get(endpoint)
+            metrics.requests += 1
+            metrics.statuses[status] += 1
+            metrics.bytes += size
+            metrics.latency.add(latency)
+
+    def record_error(self, endpoint: Optional[str], latency: float) -> None:
+        with self._lock:
+            metrics = self._get(endpoint)
+            metrics.requests += 1
+            metrics.errors += 1
+            metrics.latency.add(latency)
+
+    def record_retry(self, endpoint: Optional[str]) -> None:
+        with self._lock:
+            self._get(endpoint).retries += 1
+
+    def record_cache_hit(self, endpoint: Optional[str], revalidated: bool = False) -> None:
+        with self._lock:
+            metrics = self._get(endpoint)
+            if revalidated:
+                metrics.cache_revalidated += 1
+            else:
+                metrics.cache_hits += 1
+
+    def record_coalesced(self, endpoint: Optional[str]) -> None:
+        with self._lock:
+            self._get(endpoint).coalesced += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {name: metrics.to_dict() for name, metrics in sorted(self._endpoints.items())}
+            total = EndpointMetrics()
+            for metrics in self._endpoints.values():
+                total.requests += metrics.requests
+                total.statuses.update(metrics.statuses)
+                total.errors += metrics.errors
+                total.bytes += metrics.bytes
+                total.retries += metrics.retries
+                total.cache_hits += metrics.cache_hits
+                total.cache_revalidated += metrics.cache_revalidated
+                total.coalesced += metrics.coalesced
+                for index, count in enumerate(metrics.latency.counts):
+                    total.latency.counts[index] += count
+                total.latency.count += metrics.latency.count
+                total.latency.total += metrics.latency.total
+                total.latency.max = max(total.latency.max, metrics.latency.max)
+        return {
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(time.monotonic() - self.started, 3),
+            "endpoints": endpoints,
+            "total": total.to_dict(),
+        }
+
+    def summary_lines(self) -> List[str]:
+        report = self.snapshot()
+        wall = report["wall_seconds"]
+        lines = [
+            f"API stats ({wall:.1f} s, {report['total']['requests'] / max(wall, 1e-9):.1f} requests/s):",
+            f"{'endpoint':<10} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'MB':>7} "
+            f"{'retries':>7} {'errors':>6} {'401':>4} {'404':>4} {'cached':>6} {'304':>5} {'shared':>6}",
+        ]
+        rows = list(report["endpoints"].items()) + [("total", report["total"])]
+        for name, data in rows:
+            latency = data["latency"]
+
+            def ms(key: str) -> str:
+                return "-" if latency[key] is None else f"{latency[key]:.0f}"
+
+            lines.append(
+                f"{name:<10} {data['requests']:>8} {ms('p50_ms'):>8} {ms('p95_ms'):>8} {ms('p99_ms'):>8} "
+                f"{data['bytes'] / 1e6:>7.2f} {data['retries']:>7} {data['errors']:>6} "
+                f"{data['statuses'].get('401', 0):>4} {data['statuses'].get('404', 0):>4} "
+                f"{data['cache_hits']:>6} {data['cache_revalidated']:>5} {data['coalesced']:>6}"
+            )
+        return lines
+
+    def write_report(self, path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        report = self.snapshot()
+        if extra:
+            report.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
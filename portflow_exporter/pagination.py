@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from .constants import MAX_PREFETCH_PAGES
+
+
+@dataclass
+class PageSizeHint:
+    # Page size the server is known to use; None until proven.
+    size: Optional[int] = None
+
+
+# Learned per endpoint and requested per_page and shared by all calls, so only
+# the first goals of a run pay for finding out how the server pages.
+_hints: Dict[Tuple[str, Optional[int]], PageSizeHint] = {}
+_hints_lock = threading.Lock()
+
+
+def page_size_hint(endpoint: str, per_page: Optional[int] = None) -> PageSizeHint:
+    with _hints_lock:
+        return _hints.setdefault((endpoint, per_page), PageSizeHint())
+
+
+def set_page_size(endpoint: str, size: int, per_page: Optional[int] = None) -> None:
+    with _hints_lock:
+        _hints[(endpoint, per_page)] = PageSizeHint(size=size)
+
+
+def _default_key(item: Any) -> Optional[Hashable]:
+    return item.get("id") if isinstance(item, dict) else None
+
+
+def _header_int(response: requests.Response, *names: str) -> Optional[int]:
+    for name in names:
+        value = response.headers.get(name)
+        if value and value.strip().isdigit():
+            return int(value.strip())
+    return None
+
+
+class Paginator:
+    """
+    Walks a page-numbered endpoint and yields the new items of each page.
+
+    The last page is detected from a `Link` header without rel="next", from
+    total-count/total-pages headers, or from a page shorter than the page
+    size once that size is known. When the total is known after the first
+    page the remaining pages are fetched concurrently. Items are deduplicated
+    by `key` against the previous two pages: that drops items that shifted
+    to the next page while paging and stops a server that ignores `page`,
+    without holding a key for every item of a long history.
+
+    A short page only proves the end once the server's page size is known:
+    from an x-per-page header, or from a page of that length that was
+    followed by more items (a server may cap or ignore `per_page`). Until
+    then the next page is fetched.
+
+    `fetch(page, per_page)` returns a Response or one of the api sentinels; a
+    sentinel stops iteration and is left in `error` (with `failed` set).
+    `decode(response)` turns a page into JSON data (default: response.json()).
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int, Optional[int]], Any],
+        *,
+        endpoint: str,
+        per_page: Optional[int] = None,
+        extract: Optional[Callable[[Any], List[Any]]] = None,
+        key: Callable[[Any], Optional[Hashable]] = _default_key,
+        prefetch: bool = True,
+        decode: Optional[Callable[[requests.Response], Any]] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.endpoint = endpoint
+        self.per_page = per_page
+        self.extract = extract or (lambda data: data or [])
+        self.key = key
+        self.prefetch = prefetch
+        self.decode = decode or (lambda response: response.json())
+        self.failed = False
+        self.error: Optional[str] = None
+        self._seen: Deque[Set[Hashable]] = deque(maxlen=2)
+
+    def _get(self, page: int, per_page: Optional[int] = None) -> Optional[requests.Response]:
+        response = self.fetch(page, per_page or self.per_page)
+        if not isinstance(response, requests.Response):
+            self.failed = True
+            self.error = response
+            return None
+        return response
+
+    def _is_seen(self, item_key: Optional[Hashable]) -> bool:
+        return item_key is not None and any(item_key in keys for keys in self._seen)
+
+    def _fresh(self, items: List[Any]) -> List[Any]:
+        fresh = []
+        page_keys: Set[Hashable] = set()
+        for item in items:
+            item_key = self.key(item)
+            if item_key is None:
+                fresh.append(item)
+            elif item_key not in page_keys and not self._is_seen(item_key):
+                fresh.append(item)
+            if item_key is not None:
+                page_keys.add(item_key)
+        self._seen.append(page_keys)
+        return fresh
+
+    def _total_pages(self, response: requests.Response, first_page_len: int) -> Optional[int]:
+        total_pages = _header_int(response, "x-total-pages", "total-pages")
+        if total_pages is not None:
+            return total_pages
+
+        last = response.links.get("last", {}).get("url")
+        if last:
+            page = parse_qs(urlparse(last).query).get("page")
+            if page and page[0].isdigit():
+                return int(page[0])
+
+        total = _header_int(response, "x-total-count", "total")
+        size = _header_int(response, "x-per-page", "per-page") or first_page_len
+        if total is not None and size:
+            return -(-total // size)
+        return None
+
+    def _is_last(self, response: requests.Response, page: int, items: List[Any]) -> bool:
+        if response.links:
+            return "next" not in response.links
+        total_pages = self._total_pages(response, len(items))
+        if total_pages is not None:
+            return page >= total_pages
+
+        size = _header_int(response, "x-per-page", "per-page") or page_size_hint(self.endpoint, self.per_page).size
+        return size is not None and len(items) < size
+
+    def pages(self) -> Iterator[List[Any]]:
+        response = self._get(1)
+        if response is None:
+            return
+        items = self.extract(self.decode(response))
+
+        total_pages = self._total_pages(response, len(items)) if items else None
+        if self.prefetch and total_pages is not None and total_pages > 1:
+            yield from self._prefetched(items, total_pages)
+            return
+
+        page = 1
+        while True:
+            if not items:
+                return
+            fresh = self._fresh(items)
+            if not fresh:
+                return
+            yield fresh
+
+            if self._is_last(response, page, items):
+                return
+
+            page += 1
+            next_response = self._get(page)
+            if next_response is None:
+                return
+            next_items = self.extract(self.decode(next_response))
+            if next_items and self._fresh_count(next_items):
+                # The previous page was followed by more data, so it was full.
+                hint = page_size_hint(self.endpoint, self.per_page)
+                with _hints_lock:
+                    if hint.size is None:
+                        hint.size = len(items)
+            response, items = next_response, next_items
+
+    def _fresh_count(self, items: List[Any]) -> int:
+        return sum(1 for item in items if not self._is_seen(self.key(item)))
+
+    def _prefetched(self, first_items: List[Any], total_pages: int) -> Iterator[List[Any]]:
+        fresh = self._fresh(first_items)
+        if fresh:
+            yield fresh
+
+        workers = min(MAX_PREFETCH_PAGES, total_pages - 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="portflow-page") as executor:
+            futures = [executor.submit(self.fetch, page, self.per_page) for page in range(2, total_pages + 1)]
+            try:
+                for future in futures:
+                    response = future.result()
+                    if not isinstance(response, requests.Response):
+                        self.failed = True
+                        self.error = response
+                        return
+                    fresh = self._fresh(self.extract(self.decode(response)))
+                    if fresh:
+                        yield fresh
+            finally:
+                # Also runs when the consumer stops early.
+                for future in futures:
+                    future.cancel()
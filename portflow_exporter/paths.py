@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+
+def data_dir() -> Path:
+    # Use a per-user roaming directory on Windows when available.
+    appdata = os.environ.get("APPDATA")
+    if appdata:
+        return Path(appdata) / "PortflowExport"
+    return Path.home() / ".portflowexport"
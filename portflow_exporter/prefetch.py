@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Union
+
+from . import api, logic
+from .constants import STUDENT_PREFETCH_WORKERS
+from .feedback_store import FeedbackStore
+from .session_cache import SessionCache
+from .time_range import TimeRange
+
+
+def _background(fn: Callable[[], Any], name: str) -> "Future[Any]":
+    # A daemon thread rather than an executor, so quitting from the menu
+    # does not wait for a slow request to finish.
+    future: "Future[Any]" = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+class MetadataPrefetcher:
+    """
+    Fetches the section list and the shared collections in the background as
+    soon as the token is known, while the user is still in the menus.
+
+    The shared collections are handed out once (later menu rounds fetch a
+    fresh roster); sections are cached for the session by api.get_all_sections
+    anyway. A result for another token, or a failed background fetch, falls
+    back to a normal foreground request.
+    """
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+        self._futures: Dict[str, "Future[Any]"] = {
+            "shared": _background(lambda: api.get_shared_collections(token, quiet=True), "portflow-prefetch-shared"),
+            "sections": _background(lambda: api.get_all_sections(token, quiet=True), "portflow-prefetch-sections"),
+        }
+
+    def _result(self, name: str, token: str, consume: bool) -> Any:
+        future = self._futures.get(name) if token == self.token else None
+        if future is None:
+            return None
+        if consume:
+            del self._futures[name]
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def shared_collections(self, token: str) -> Union[List[dict], str, None]:
+        shared = self._result("shared", token, consume=True)
+        if isinstance(shared, list):
+            print(f"Found {len(shared)} shared collections.")
+            return shared
+        if shared == api.TokenExpired:
+            return shared
+        return api.get_shared_collections(token)
+
+    def sections(self, token: str) -> Union[List[dict], str, None]:
+        sections = self._result("sections", token, consume=False)
+        if isinstance(sections, list) or sections == api.TokenExpired:
+            return sections
+        return api.get_all_sections(token)
+
+
+class StudentPrefetcher:
+    """
+    Opt-in speculative fetching of a roster in single-student mode.
+
+    A few background threads warm the session cache with goals and the full
+    feedback history of each student, in alphabetical order (the order the
+    roster is printed) and continuing after the student looked up last.
+    Every background request first waits until no foreground lookup is
+    running (see api.background), and background threads fetch pages one at
+    a time, so at most one request per thread is still in flight when the
+    user looks someone up.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        students: Dict[str, dict],
+        session: SessionCache,
+        store: Optional[FeedbackStore] = None,
+        workers: int = STUDENT_PREFETCH_WORKERS,
+    ) -> None:
+        self.token = token
+        self.students = students
+        self.session = session
+        self.store = store
+        self.done: Set[str] = set()
+        self._pending: List[str] = sorted(students)
+        self._lock = threading.Lock()
+        self._foreground = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stop = threading.Event()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._work, name=f"portflow-speculative_{i}", daemon=True).start()
+
+    def matches(self, token: str, students: Dict[str, dict]) -> bool:
+        return token == self.token and students.keys() == self.students.keys()
+
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        with self._lock:
+            self._foreground += 1
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground -= 1
+                if self._foreground == 0:
+                    self._idle.set()
+
+    def focus(self, name: str) -> None:
+        # Users tend to go down the list: students after `name` come first.
+        with self._lock:
+            after = [n for n in self._pending if n > name]
+            before = [n for n in self._pending if n <= name]
+            self._pending = after + before
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._idle.set()
+
+    def _next(self) -> Optional[str]:
+        with self._lock:
+            return self._pending.pop(0) if self._pending else None
+
+    def _wait_turn(self) -> bool:
+        while not self._stop.is_set():
+            if self._idle.wait(0.5) and not self._stop.is_set():
+                return True
+        return False
+
+    def _work(self) -> None:
+        # The gate is checked before every request, page fetches included.
+        with api.background(self._wait_turn):
+            self._prefetch()
+
+    def _prefetch(self) -> None:
+        full_history = TimeRange()
+        while self._wait_turn():
+            name = self._next()
+            if name is None:
+                return
+            for portfolio_id in self.students[name]["portfolio_ids"]:
+                if self._stop.is_set():
+                    return
+                goals = logic.fetch_goals(self.token, portfolio_id, self.session)
+                if goals == api.TokenExpired:
+                    self.stop()
+                    return
+                if not isinstance(goals, list):
+                    continue
+                for goal in goals:
+                    if self._stop.is_set():
+                        return
+                    index = logic.fetch_goal_index(
+                        self.token, portfolio_id, goal["id"], self.store, full_history, self.session
+                    )
+                    if index == api.TokenExpired:
+                        self.stop()
+                        return
+            with self._lock:
+                self.done.add(name)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Active tracer for this process; None means spans cost one global lookup.
+_tracer: Optional["Tracer"] = None
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.start = time.perf_counter_ns()
+        return self.args
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.complete(self.name, self.start, time.perf_counter_ns(), self.args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> Dict[str, Any]:
+        # Callers may add args to the span; with tracing off they go nowhere.
+        return {}
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collects spans as Chrome trace "complete" events.
+
+    The output opens in chrome://tracing, https://ui.perfetto.dev and
+    https://www.speedscope.app. Worker threads get their own track, so the
+    parallel engine shows up as overlapping goals/feedback spans.
+    """
+
+    def __init__(self, memory: bool = False) -> None:
+        self.memory = memory
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _tid(self) -> int:
+        thread = threading.current_thread()
+        tid = thread.ident or 0
+        if tid not in self._threads:
+            with self._lock:
+                self._threads[tid] = thread.name
+        return tid
+
+    def complete(self, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]) -> None:
+        tid = self._tid()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start_ns - self.origin) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+        if self.memory:
+            self._memory_counter(end_ns)
+
+    def _memory_counter(self, now_ns: int) -> None:
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self.events.append(
+                {
+                    "name": "python heap (MB)",
+                    "ph": "C",
+                    "ts": (now_ns - self.origin) / 1000,
+                    "pid": self.pid,
+                    "args": {"current": round(current / 1e6, 2), "peak": round(peak / 1e6, 2)},
+                }
+            )
+
+    def write(self, path: str) -> None:
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+
+def span(name: str, **args: Any):
+    """
+    Time a block as a named span when profiling is on:
+
+        with profiling.span("get_feedback", goal=goal_id) as span_args:
+            ...
+            span_args["items"] = len(items)
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, args)
+
+
+class Profiler:
+    """
+    One profiling session for `--profile`: spans always, plus optionally
+    cProfile (main thread, written as PATH.prof for pstats/snakeviz) and
+    tracemalloc (heap counter in the trace, top allocations in PATH.memory.txt).
+    """
+
+    def __init__(self, path: str, cpu: bool = False, memory: bool = False) -> None:
+        self.path = path
+        self.cpu = cpu
+        self.memory = memory
+        self._cprofile = None
+
+    def start(self) -> None:
+        global _tracer
+        if self.memory:
+            import tracemalloc
+
+            tracemalloc.start()
+        if self.cpu:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        _tracer = Tracer(memory=self.memory)
+
+    def stop(self) -> List[str]:
+        global _tracer
+        tracer, _tracer = _tracer, None
+        written: List[str] = []
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.path + ".prof")
+            written.append(self.path + ".prof")
+            self._cprofile = None
+
+        if self.memory:
+            import tracemalloc
+
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                with open(self.path + ".memory.txt", "w", encoding="utf-8") as f:
+                    f.write(f"Peak traced memory: {peak / 1e6:.1f} MB\n\nTop allocations still alive at exit:\n")
+                    for stat in snapshot.statistics("lineno")[:30]:
+                        f.write(f"{stat}\n")
+                written.append(self.path + ".memory.txt")
+
+        if tracer is not None:
+            tracer.write(self.path)
+            written.insert(0, self.path)
+        return written
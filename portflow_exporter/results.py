@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .session_cache import Evaluation
+
+UNKNOWN_REVIEWER = "Unknown"
+
+
+class StringTable:
+    """Interns strings as small integer ids; lookups never take the lock."""
+
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def id(self, value: str) -> int:
+        found = self._ids.get(value)
+        if found is None:
+            with self._lock:
+                found = self._ids.get(value)
+                if found is None:
+                    found = len(self.strings)
+                    self.strings.append(value)
+                    self._ids[value] = found
+        return found
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class ResultSet:
+    """
+    Evaluation rows (student, goal, level, reviewer) as four integer columns
+    over string tables shared by every result set of the process, instead of
+    one dict per row repeating the same names.
+
+    Iterating yields the old row dicts, so code that wants dicts (the
+    journal, shard files) still gets them; the exporters use the grouped
+    views, which format each distinct level/reviewer pair only once.
+    """
+
+    students = StringTable()
+    goals = StringTable()
+    levels = StringTable()
+    reviewers = StringTable()
+
+    __slots__ = ("include_reviewer", "_student", "_goal", "_level", "_reviewer")
+
+    def __init__(self, include_reviewer: bool = False) -> None:
+        self.include_reviewer = include_reviewer
+        self._student = array("I")
+        self._goal = array("I")
+        self._level = array("I")
+        # Left empty when the reviewer is not exported.
+        self._reviewer = array("I")
+
+    def __len__(self) -> int:
+        return len(self._level)
+
+    def add(self, student_name: str, goal_name: str, level: str, reviewer_name: Optional[str] = None) -> None:
+        self._student.append(self.students.id(student_name))
+        self._goal.append(self.goals.id(goal_name))
+        self._level.append(self.levels.id(level))
+        if self.include_reviewer:
+            self._reviewer.append(self.reviewers.id(reviewer_name or UNKNOWN_REVIEWER))
+
+    def add_evaluations(self, student_name: str, goal_name: str, evaluations: List[Evaluation]) -> None:
+        count = len(evaluations)
+        self._student.extend(repeat(self.students.id(student_name), count))
+        self._goal.extend(repeat(self.goals.id(goal_name), count))
+        # Evaluation levels are ids in self.levels already.
+        self._level.extend([e.level for e in evaluations])
+        if self.include_reviewer:
+            reviewer_id = self.reviewers.id
+            self._reviewer.extend([reviewer_id(e.reviewer_name) for e in evaluations])
+
+    def extend(self, other: "ResultSet", student_name: Optional[str] = None) -> None:
+        """Append `other`'s rows, optionally as rows of `student_name`."""
+        if student_name is None:
+            self._student.extend(other._student)
+        else:
+            self._student.extend(repeat(self.students.id(student_name), len(other)))
+        self._goal.extend(other._goal)
+        self._level.extend(other._level)
+        if self.include_reviewer:
+            if other.include_reviewer:
+                self._reviewer.extend(other._reviewer)
+            else:
+                self._reviewer.extend(repeat(self.reviewers.id(UNKNOWN_REVIEWER), len(other)))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], include_reviewer: Optional[bool] = None) -> "ResultSet":
+        if isinstance(rows, ResultSet):
+            return rows
+        rows = list(rows)
+        if include_reviewer is None:
+            include_reviewer = any("reviewer_name" in r for r in rows)
+        results = cls(include_reviewer)
+        for r in rows:
+            results.add(r["student_name"], r["goal_name"], r["evaluation"], r.get("reviewer_name"))
+        return results
+
+    def __iter__(self) -> Iterator[dict]:
+        students, goals, levels = self.students.strings, self.goals.strings, self.levels.strings
+        if self.include_reviewer:
+            reviewers = self.reviewers.strings
+            for s, g, lvl, rev in zip(self._student, self._goal, self._level, self._reviewer):
+                yield {
+                    "student_name": students[s],
+                    "goal_name": goals[g],
+                    "evaluation": levels[lvl],
+                    "reviewer_name": reviewers[rev],
+                }
+        else:
+            for s, g, lvl in zip(self._student, self._goal, self._level):
+                yield {"student_name": students[s], "goal_name": goals[g], "evaluation": levels[lvl]}
+
+    def rows(self) -> List[dict]:
+        return list(self)
+
+    def _labels(self, include_reviewer: bool) -> Iterator[str]:
+        # Each distinct (level, reviewer) pair is formatted once.
+        levels = self.levels.strings
+        if not (include_reviewer and self.include_reviewer):
+            if include_reviewer:
+                return (f"{levels[lvl]} ({UNKNOWN_REVIEWER})" for lvl in self._level)
+            return (levels[lvl] for lvl in self._level)
+        reviewers = self.reviewers.strings
+        formatted: Dict[Tuple[int, int], str] = {}
+
+        def label(pair: Tuple[int, int]) -> str:
+            text = formatted.get(pair)
+            if text is None:
+                text = formatted[pair] = f"{levels[pair[0]]} ({reviewers[pair[1]]})"
+            return text
+
+        return (label(pair) for pair in zip(self._level, self._reviewer))
+
+    def by_goal(self, include_reviewer: Optional[bool] = None) -> Dict[str, List[str]]:
+        """Formatted evaluations per goal name, in row order (for one student)."""
+        if include_reviewer is None:
+            include_reviewer = self.include_reviewer
+        grouped: Dict[int, List[str]] = {}
+        for goal, label in zip(self._goal, self._labels(include_reviewer)):
+            column = grouped.get(goal)
+            if column is None:
+                column = grouped[goal] = []
+            column.append(label)
+        goals = self.goals.strings
+        return {goals[goal]: labels for goal, labels in grouped.items()}
+
+
+Results = Union[ResultSet, List[dict]]
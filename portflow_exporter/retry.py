@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Deque, FrozenSet, Optional
+
+from .constants import (
+    CIRCUIT_BREAKER_COOLDOWN,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_WINDOW,
+    RETRY_BASE_DELAY,
+    RETRY_BUDGET,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY,
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = RETRY_MAX_ATTEMPTS
+    base_delay: float = RETRY_BASE_DELAY
+    max_delay: float = RETRY_MAX_DELAY
+    retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+
+    def backoff(self, attempt: int) -> float:
+        # Exponential backoff with "equal jitter": half fixed, half random, so
+        # parallel workers that failed together do not retry in lockstep.
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(attempt - 1, 0)))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryBudget:
+    """Caps the number of retries for the whole run, so a dead API fails fast."""
+
+    def __init__(self, limit: int = RETRY_BUDGET) -> None:
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Shared pause switch for all workers.
+
+    Each request counts once towards the error rate of the last `window`
+    requests, however often it is retried, so a few goals that keep failing
+    do not look like an outage. When at least `threshold` of them failed,
+    and no fewer than succeeded, or on a 429 with Retry-After, the breaker
+    opens and every request waits until the cooldown has passed, instead of
+    each worker hammering a degraded API on its own schedule. Then a single
+    probe request is let through: if it fails the breaker opens again,
+    otherwise everyone continues. A probe that never reports back is
+    replaced after another cooldown.
+    """
+
+    def __init__(
+        self,
+        threshold: int = CIRCUIT_BREAKER_THRESHOLD,
+        cooldown: float = CIRCUIT_BREAKER_COOLDOWN,
+        window: int = CIRCUIT_BREAKER_WINDOW,
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        # True for a request that succeeded, False for one that failed.
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._open_until = 0.0
+        self._tripped = False
+        # Thread id of the probe while half-open.
+        self._probe: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._tripped
+
+    def wait(self, stop: Optional[threading.Event] = None) -> bool:
+        """Block while the breaker is open; False if `stop` was set meanwhile."""
+        while True:
+            with self._lock:
+                if not self._tripped or self._probe == threading.get_ident():
+                    return True
+                remaining = self._open_until - time.monotonic()
+                if remaining <= 0:
+                    # Half-open: this thread probes, the others wait for it.
+                    self._probe = threading.get_ident()
+                    self._open_until = time.monotonic() + self.cooldown
+                    return True
+            if stop is None:
+                time.sleep(min(remaining, 1.0))
+            elif stop.wait(min(remaining, 1.0)):
+                return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._outcomes.append(True)
+            if self._tripped and self._probe == threading.get_ident():
+                self._tripped = False
+                self._probe = None
+                self._outcomes.clear()
+
+    def record_failure(self, retry_after: Optional[float] = None, retry: bool = False) -> None:
+        """`retry` marks a repeated attempt of a request that already failed; it is not counted again."""
+        with self._lock:
+            now = time.monotonic()
+            probe = self._tripped and self._probe == threading.get_ident()
+            if self._tripped and not probe:
+                # Sent before the breaker opened; only the probe decides what happens next.
+                if retry_after is not None:
+                    self._open_until = max(self._open_until, now + retry_after)
+                return
+            if not retry:
+                self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if retry_after is not None:
+                pause = retry_after
+            elif probe or (failures >= self.threshold and failures * 2 >= len(self._outcomes)):
+                pause = self.cooldown
+            else:
+                return
+            if pause <= 0:
+                return
+            if pause >= 5:
+                print(f"API looks degraded; pausing all requests for {pause:.0f} seconds...")
+            self._tripped = True
+            self._probe = None
+            self._open_until = now + pause
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Hashable, List, NamedTuple, Optional, Tuple
+
+from .constants import SESSION_CACHE_MAX_EVALUATIONS, SESSION_CACHE_TTL
+from .time_range import TimeRange
+
+
+class Evaluation(NamedTuple):
+    # Epoch microseconds, see time_range.datetime_epoch_us.
+    timestamp: Optional[int]
+    # Id of the level label in ResultSet.levels, see levels.LevelIndex.
+    level: int
+    reviewer_name: str
+
+
+class GoalIndex:
+    """
+    The evaluations of one goal, in API order, with a timestamp index.
+
+    `covered_from` is the time-range start the feedback was fetched with
+    (None for the full history); feedback fetched with an early stop can only
+    answer ranges that start at or after it.
+    """
+
+    def __init__(self, evaluations: List[Evaluation], covered_from: Optional[datetime] = None) -> None:
+        self.evaluations = evaluations
+        self.covered_from = covered_from
+        self._order: Optional[List[int]] = None
+        self._timestamps: List[int] = []
+
+    def covers(self, time_range: TimeRange) -> bool:
+        if self.covered_from is None:
+            return True
+        return time_range.start is not None and time_range.start >= self.covered_from
+
+    def _index(self) -> List[int]:
+        # Built on the first bounded query; positions sorted by timestamp.
+        if self._order is None:
+            order = sorted(
+                (i for i, e in enumerate(self.evaluations) if e.timestamp is not None),
+                key=lambda i: self.evaluations[i].timestamp,  # type: ignore[arg-type, return-value]
+            )
+            self._timestamps = [self.evaluations[i].timestamp for i in order]  # type: ignore[misc]
+            self._order = order
+        return self._order
+
+    def in_range(self, time_range: TimeRange) -> List[Evaluation]:
+        if time_range.start is None and time_range.end is None:
+            return self.evaluations
+        order = self._index()
+        start, end = time_range.epoch_window()
+        lo = bisect.bisect_left(self._timestamps, start) if start is not None else 0
+        hi = bisect.bisect_right(self._timestamps, end) if end is not None else len(order)
+        # Back to API order, which is the order evaluations appear in the CSV.
+        return [self.evaluations[i] for i in sorted(order[lo:hi])]
+
+
+class SessionCache:
+    """
+    Goals and evaluation indexes fetched during this interactive session.
+
+    Lets a second lookup of the same student, or a re-export with another
+    time range or reviewer setting, be answered without any requests.
+    Entries expire after `ttl` seconds and the least recently used ones are
+    dropped once more than `max_evaluations` evaluations are held.
+    """
+
+    def __init__(self, max_evaluations: int = SESSION_CACHE_MAX_EVALUATIONS, ttl: float = SESSION_CACHE_TTL) -> None:
+        self.max_evaluations = max_evaluations
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, object]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, size, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key: Hashable, value: object, size: int) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (time.monotonic(), size, value)
+            self._size += size
+            while self._size > self.max_evaluations and len(self._entries) > 1:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def goals(self, portfolio_id: str) -> Optional[List[dict]]:
+        return self._get(("goals", portfolio_id))  # type: ignore[return-value]
+
+    def put_goals(self, portfolio_id: str, goals: List[dict]) -> None:
+        self._put(("goals", portfolio_id), goals, 1)
+
+    def goal_index(self, portfolio_id: str, goal_id: str, time_range: TimeRange) -> Optional[GoalIndex]:
+        index = self._get(("feedback", portfolio_id, goal_id))
+        if isinstance(index, GoalIndex) and index.covers(time_range):
+            return index
+        return None
+
+    def put_goal_index(self, portfolio_id: str, goal_id: str, index: GoalIndex) -> None:
+        self._put(("feedback", portfolio_id, goal_id), index, 1 + len(index.evaluations))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+from .exporters import StreamingCsvWriter
+from .journal import export_fingerprint
+from .results import ResultSet
+from .time_range import TimeRange
+
+PARTIAL_VERSION = 1
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """'2/4' -> (2, 4); shards are numbered from 1."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"expected i/N, got {value!r}") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"shard {value!r} is out of range")
+    return index, count
+
+
+def shard_of(student_name: str, student_data: dict, count: int) -> int:
+    # A stable hash (not hash()), so every host assigns students the same way.
+    key = str(student_data.get("student_id") or student_name)
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big") % count + 1
+
+
+def select_shard(students: Dict[str, dict], index: int, count: int) -> Dict[str, dict]:
+    return {name: data for name, data in students.items() if shard_of(name, data, count) == index}
+
+
+def partial_path(index: int, count: int, csv_path: str = "results.csv") -> str:
+    base = csv_path[:-4] if csv_path.endswith(".csv") else csv_path
+    return f"{base}.shard-{index}-of-{count}.jsonl"
+
+
+class ShardWriter:
+    """
+    Partial result file of one shard, for `merge`.
+
+    JSONL like the checkpoint journal: a header identifying the export (the
+    full roster, reviewer toggle and time range) and the roster positions of
+    this shard's students, then one line per finished student. Takes the
+    place of StreamingCsvWriter in a sharded export.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        index: int,
+        count: int,
+        roster: List[str],
+        assigned: List[str],
+        include_reviewer: bool,
+        time_range: TimeRange,
+    ) -> None:
+        self.path = path
+        self.rows_written = 0
+        positions = {name: position for position, name in enumerate(roster)}
+        header = {
+            "version": PARTIAL_VERSION,
+            "shard": index,
+            "of": count,
+            "fingerprint": export_fingerprint(roster, include_reviewer, time_range),
+            "roster_size": len(roster),
+            "include_reviewer": include_reviewer,
+            "time_range": time_range.describe(),
+            "students": [[positions[name], name] for name in assigned],
+        }
+        self._f: Optional[TextIO] = open(path, "w", encoding="utf-8")
+        self._f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def write_student(self, student_name: str, results: Iterable[dict]) -> None:
+        # Students without evaluations are written too, so merge can tell
+        # "nothing found" from "not exported yet".
+        entry = {"student": student_name, "results": list(results)}
+        self._f.write(json.dumps(entry, ensure_ascii=False) + "\n")  # type: ignore[union-attr]
+        self._f.flush()  # type: ignore[union-attr]
+        if entry["results"]:
+            self.rows_written += 1
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def discard(self) -> None:
+        # A shard without any evaluations is still needed by merge.
+        self.close()
+
+
+def read_partial(path: str) -> Tuple[dict, Dict[str, List[dict]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "null")
+        if not isinstance(header, dict) or header.get("version") != PARTIAL_VERSION:
+            raise ValueError(f"{path} is not a shard result file")
+        done: Dict[str, List[dict]] = {}
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            done[entry["student"]] = entry["results"]
+    return header, done
+
+
+def merge_partials(paths: List[str]) -> Tuple[List[Tuple[str, ResultSet]], bool]:
+    """
+    Combine the partial files of all shards into (student, results) pairs in
+    roster order. Raises ValueError when shards are missing, incomplete or
+    belong to different exports.
+    """
+    shards: Dict[int, Tuple[dict, Dict[str, List[dict]]]] = {}
+    for path in paths:
+        header, done = read_partial(path)
+        first = next(iter(shards.values()), None)
+        if first is not None and (header["fingerprint"], header["of"]) != (first[0]["fingerprint"], first[0]["of"]):
+            raise ValueError(f"{path} belongs to another export (other students, period or reviewer setting)")
+        if header["shard"] in shards:
+            raise ValueError(f"shard {header['shard']}/{header['of']} is given twice")
+        shards[header["shard"]] = (header, done)
+
+    if not shards:
+        raise ValueError("no shard files given")
+    count = next(iter(shards.values()))[0]["of"]
+    missing = [str(i) for i in range(1, count + 1) if i not in shards]
+    if missing:
+        raise ValueError(f"missing shard(s) {', '.join(missing)} of {count}")
+
+    ordered: List[Tuple[int, str, List[dict]]] = []
+    for index, (header, done) in sorted(shards.items()):
+        unfinished = [name for _, name in header["students"] if name not in done]
+        if unfinished:
+            raise ValueError(f"shard {index}/{count} is incomplete ({len(unfinished)} students not exported yet)")
+        ordered.extend((position, name, done[name]) for position, name in header["students"])
+
+    roster_size = next(iter(shards.values()))[0]["roster_size"]
+    if len(ordered) != roster_size:
+        raise ValueError(f"shards cover {len(ordered)} of {roster_size} students")
+
+    ordered.sort(key=lambda item: item[0])
+    include_reviewer = next(iter(shards.values()))[0]["include_reviewer"]
+    return [(name, ResultSet.from_rows(rows, include_reviewer)) for _, name, rows in ordered], include_reviewer
+
+
+def run_merge(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="portflow_export.py merge",
+        description="Combine the partial files of a --shard export into one CSV.",
+    )
+    parser.add_argument("partials", nargs="+", metavar="FILE", help="Partial files (results.shard-i-of-N.jsonl).")
+    parser.add_argument("--output", "-o", type=str, default="results.csv", help="CSV to write (default: results.csv).")
+    args = parser.parse_args(argv)
+
+    try:
+        students, include_reviewer = merge_partials(args.partials)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cannot merge: {e}")
+        return 1
+
+    print(f"Merged {len(args.partials)} shards.")
+    # The same writer as an unsharded export, so both produce the same file.
+    with StreamingCsvWriter(args.output, include_reviewer=include_reviewer) as writer:
+        for name, results in students:
+            writer.write_student(name, results)
+    if writer.rows_written:
+        print(f"CSV exported to {writer.path}")
+    else:
+        writer.discard()
+        print("\nNo evaluation data found for any student.")
+    return 0
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from .constants import MAX_CONNECTIONS
+
+
+def _percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of requests in flight.
+
+    The limit grows by one after a full "window" of healthy responses and is
+    cut multiplicatively on 429/5xx/connection errors or when the p95 latency
+    climbs well above the best p95 seen so far. Decreases are rate-limited so
+    one burst of failures counts as a single congestion signal.
+    """
+
+    def __init__(
+        self,
+        max_limit: int = MAX_CONNECTIONS,
+        initial: int = 4,
+        min_limit: int = 1,
+        backoff: float = 0.5,
+        latency_factor: float = 2.0,
+        sample_size: int = 100,
+    ) -> None:
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = max(self.min_limit, min(initial, self.max_limit))
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+
+        self._in_flight = 0
+        self._successes = 0
+        self._completed = 0
+        self._latencies: Deque[float] = deque(maxlen=sample_size)
+        self._finished_at: Deque[float] = deque(maxlen=1000)
+        self._baseline_p95: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency: Optional[float], congested: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            self._completed += 1
+            self._finished_at.append(now)
+
+            if congested:
+                self._decrease(now)
+            elif latency is not None:
+                self._latencies.append(latency)
+                self._successes += 1
+                if self._latency_degraded():
+                    self._decrease(now)
+                elif self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def _latency_degraded(self) -> bool:
+        if len(self._latencies) < 20:
+            return False
+        p95 = _percentile(list(self._latencies), 0.95)
+        if self._baseline_p95 is None or p95 < self._baseline_p95:
+            self._baseline_p95 = p95
+            return False
+        # Let the baseline drift up slowly so a server that is simply slower
+        # today does not keep the limit pinned at the minimum.
+        self._baseline_p95 *= 1.01
+        return p95 > self._baseline_p95 * self.latency_factor
+
+    def _decrease(self, now: float) -> None:
+        # One cut per second at most; in-flight requests from before the cut
+        # would otherwise each halve the limit again.
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self._successes = 0
+        self._latencies.clear()
+        self.limit = max(self.min_limit, int(self.limit * self.backoff))
+
+    def throughput(self, window: float = 10.0) -> float:
+        with self._cond:
+            now = time.monotonic()
+            recent = [t for t in self._finished_at if now - t <= window]
+        if len(recent) < 2:
+            return 0.0
+        return len(recent) / max(now - recent[0], 1e-6)
+
+    def snapshot(self) -> Dict[str, float]:
+        rate = self.throughput()
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "requests_per_second": round(rate, 2),
+            }
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -19,6 +19,10 @@ class TimeRange:
             return f"From {self.start.isoformat()}"
         return f"Until {self.end.isoformat()}"
 
+    def epoch_window(self) -> Tuple[Optional[int], Optional[int]]:
+        """start and end in epoch microseconds (see datetime_epoch_us)."""
+        return datetime_epoch_us(self.start), datetime_epoch_us(self.end)
+
 
 def parse_iso_datetime(value: Any) -> Optional[datetime]:
     if value is None:
@@ -55,6 +59,17 @@ def parse_iso_datetime(value: Any) -> Optional[datetime]:
     return dt
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def datetime_epoch_us(dt: Optional[datetime]) -> Optional[int]:
+    return None if dt is None else (dt - _EPOCH) // _MICROSECOND
+
+
+_EVALUATION_DATE_KEYS = ("date", "evaluation_date", "evaluationDate")
+
+
 def pick_evaluation_timestamp(item: dict) -> Optional[datetime]:
     # Your API returns top-level "date" as the evaluation moment
     for key in ("date", "evaluation_date", "evaluationDate"):
@@ -84,6 +99,33 @@ def pick_evaluation_timestamp(item: dict) -> Optional[datetime]:
     return None
 
 
+def has_evaluation_date(item: dict) -> bool:
+    """Whether the item has an evaluation date, which the range filter reads before created_at."""
+    if any(item.get(key) is not None for key in _EVALUATION_DATE_KEYS):
+        return True
+    evaluation = item.get("evaluation")
+    return isinstance(evaluation, dict) and any(evaluation.get(key) is not None for key in _EVALUATION_DATE_KEYS)
+
+
+def pick_created_timestamp(item: dict) -> Optional[datetime]:
+    # The key the API sorts on with order_by=created_at
+    for key in ("created_at", "createdAt"):
+        dt = parse_iso_datetime(item.get(key))
+        if dt:
+            return dt
+    return None
+
+
+def evaluation_timestamp(item: dict) -> Optional[int]:
+    """pick_evaluation_timestamp in epoch microseconds."""
+    return datetime_epoch_us(pick_evaluation_timestamp(item))
+
+
+def created_timestamp(item: dict) -> Optional[int]:
+    """pick_created_timestamp in epoch microseconds."""
+    return datetime_epoch_us(pick_created_timestamp(item))
+
+
 def in_time_range(ts: Optional[datetime], tr: TimeRange) -> bool:
     if ts is None:
         # strict when a range is set
@@ -0,0 +1,134 @@
+"""
+Paginator against the mock server's paging quirks.
+
+The page-size learning is shared by all calls, so a wrong guess would stop
+later histories early without any error; every case checks that each goal
+comes back complete, in order and without duplicates.
+"""
+
+from __future__ import annotations
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import pytest
+import requests
+
+from benchmarks import synthetic
+from benchmarks.mock_server import MockPortflowServer, ServerConfig
+from benchmarks.synthetic import CohortSpec
+from portflow_exporter import pagination
+from portflow_exporter.pagination import Paginator
+
+SPEC = CohortSpec(students=16, goals_per_portfolio=5, items_per_goal=8)
+# Both smaller than PER_PAGE, so a server ignoring or capping per_page sends
+# pages that look short.
+SERVER_PAGE_SIZE = 4
+MAX_PER_PAGE = 3
+PER_PAGE = 5
+
+QUIRKS = [
+    pytest.param(per_page, links, total, id=f"per_page={per_page}-link={links}-total_count={total}")
+    for per_page, links, total in itertools.product(["honoured", "capped", "ignored"], [False, True], [False, True])
+]
+
+
+def _goal_ids() -> List[str]:
+    return [
+        goal["id"]
+        for index in range(SPEC.students)
+        for portfolio_id in synthetic.portfolio_ids(SPEC, index)
+        for goal in synthetic.goals(SPEC, portfolio_id)
+    ]
+
+
+def _expected(goal_id: str) -> List[str]:
+    portfolio_id = goal_id.rsplit("-g", 1)[0]
+    return [item["id"] for item in synthetic.feedback_items(SPEC, portfolio_id, goal_id)]
+
+
+GOALS = _goal_ids()
+_session = requests.Session()
+
+
+@pytest.fixture(autouse=True)
+def fresh_hints(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Each test starts without anything learned, like a new run.
+    monkeypatch.setattr(pagination, "_hints", {})
+
+
+def _server(per_page: str, link_headers: bool, total_count_header: bool) -> MockPortflowServer:
+    config = ServerConfig(
+        spec=SPEC,
+        ignore_per_page=per_page == "ignored",
+        server_page_size=SERVER_PAGE_SIZE,
+        max_per_page=MAX_PER_PAGE if per_page == "capped" else None,
+        link_headers=link_headers,
+        total_count_header=total_count_header,
+        etags=False,
+    )
+    return MockPortflowServer(config)
+
+
+def _fetch_goal(server: MockPortflowServer, goal_id: str, prefetch: bool = True, per_page: int = PER_PAGE) -> List[str]:
+    portfolio_id = goal_id.rsplit("-g", 1)[0]
+    url = f"{server.base_url}/portfolios/{portfolio_id}/goals/{goal_id}/feedback-items"
+
+    def fetch(page: int, per_page: Optional[int]) -> requests.Response:
+        params = {"page": page}
+        if per_page is not None:
+            params["per_page"] = per_page
+        return _session.get(url, params=params, timeout=10)
+
+    paginator = Paginator(fetch, endpoint="feedback", per_page=per_page, prefetch=prefetch)
+    ids = [item["id"] for page in paginator.pages() for item in page]
+    assert not paginator.failed
+    return ids
+
+
+def test_goals_cover_page_boundaries() -> None:
+    # The cases below are only meaningful if some histories end exactly on a
+    # page boundary and others on a short last page, for both page sizes.
+    counts = {len(_expected(goal_id)) for goal_id in GOALS}
+    for size in (PER_PAGE, SERVER_PAGE_SIZE, MAX_PER_PAGE):
+        assert any(count % size == 0 for count in counts)
+        assert any(count % size for count in counts)
+    assert any(count < PER_PAGE for count in counts)
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+@pytest.mark.parametrize("per_page, link_headers, total_count_header", QUIRKS)
+def test_complete_histories(per_page: str, link_headers: bool, total_count_header: bool, prefetch: bool) -> None:
+    with _server(per_page, link_headers, total_count_header) as server:
+        # Twice: the second pass runs with everything the first one learned.
+        for _ in range(2):
+            for goal_id in GOALS:
+                assert _fetch_goal(server, goal_id, prefetch) == _expected(goal_id), goal_id
+
+
+@pytest.mark.parametrize("per_page, link_headers, total_count_header", QUIRKS)
+def test_complete_histories_concurrently(per_page: str, link_headers: bool, total_count_header: bool) -> None:
+    # Learning races between threads, as with --workers.
+    with _server(per_page, link_headers, total_count_header) as server:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda goal_id: _fetch_goal(server, goal_id), GOALS))
+    for goal_id, ids in zip(GOALS, results):
+        assert ids == _expected(goal_id), goal_id
+
+
+def test_ignored_per_page_is_not_mistaken_for_the_end() -> None:
+    # Asking for 50 makes every page look short until the real page size is learned.
+    with _server("ignored", False, False) as server:
+        for goal_id in GOALS:
+            assert _fetch_goal(server, goal_id, per_page=50) == _expected(goal_id), goal_id
+    assert pagination.page_size_hint("feedback", 50).size == SERVER_PAGE_SIZE
+
+
+def test_capped_per_page_is_not_mistaken_for_the_end() -> None:
+    # The server honours small per_page values (such as 1) but not 50, so
+    # honouring per_page once proves nothing about the page size.
+    with _server("capped", False, False) as server:
+        for goal_id in GOALS:
+            assert _fetch_goal(server, goal_id, per_page=50) == _expected(goal_id), goal_id
+    assert pagination.page_size_hint("feedback", 50).size == MAX_PER_PAGE
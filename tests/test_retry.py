@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from portflow_exporter.retry import CircuitBreaker
+
+COOLDOWN = 0.2
+
+
+def _tripped() -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=3, cooldown=COOLDOWN, window=10)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.is_open
+    return breaker
+
+
+def test_retries_of_one_request_count_once() -> None:
+    breaker = CircuitBreaker(threshold=3, cooldown=COOLDOWN, window=10)
+    breaker.record_failure()
+    for _ in range(10):
+        breaker.record_failure(retry=True)
+    assert not breaker.is_open
+
+
+def test_a_few_failing_requests_among_successes_do_not_open() -> None:
+    breaker = CircuitBreaker(threshold=3, cooldown=COOLDOWN, window=10)
+    for _ in range(6):
+        breaker.record_success()
+    for _ in range(4):
+        breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_retry_after_opens_at_once() -> None:
+    breaker = CircuitBreaker(threshold=3, cooldown=COOLDOWN, window=10)
+    breaker.record_failure(retry_after=COOLDOWN)
+    assert breaker.is_open
+
+
+def test_one_probe_after_the_cooldown() -> None:
+    breaker = _tripped()
+    started = time.monotonic()
+    assert breaker.wait()
+    assert time.monotonic() - started >= COOLDOWN * 0.9
+
+    # Half-open: other threads wait for the probe to report.
+    released = threading.Event()
+    waiter = threading.Thread(target=lambda: breaker.wait() and released.set())
+    waiter.start()
+    assert not released.wait(COOLDOWN / 2)
+
+    breaker.record_success()
+    assert released.wait(1.0)
+    waiter.join()
+    assert not breaker.is_open
+    # The failures before the pause are forgotten.
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_failed_probe_opens_again() -> None:
+    breaker = _tripped()
+    assert breaker.wait()
+    breaker.record_failure(retry=True)
+    assert breaker.is_open
+    started = time.monotonic()
+    assert breaker.wait()
+    assert time.monotonic() - started >= COOLDOWN * 0.9
+
+
+def test_failures_of_requests_sent_before_opening_are_ignored() -> None:
+    breaker = _tripped()
+    other = threading.Thread(target=breaker.record_failure)
+    other.start()
+    other.join()
+    # The cooldown is not extended: the probe is let through on time.
+    started = time.monotonic()
+    assert breaker.wait()
+    assert time.monotonic() - started < COOLDOWN * 2
+
+
+def test_unanswered_probe_is_replaced() -> None:
+    breaker = _tripped()
+    probe = threading.Thread(target=breaker.wait)
+    probe.start()
+    probe.join()
+    started = time.monotonic()
+    assert breaker.wait()
+    assert time.monotonic() - started >= COOLDOWN * 0.9
+
+
+def test_wait_gives_up_when_stopped() -> None:
+    breaker = CircuitBreaker(threshold=3, cooldown=30.0, window=10)
+    for _ in range(3):
+        breaker.record_failure()
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    started = time.monotonic()
+    assert not breaker.wait(stop)
+    assert time.monotonic() - started < 2.0